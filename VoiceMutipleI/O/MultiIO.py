@@ -1,39 +1,43 @@
+import argparse
 import tkinter as tk
 from tkinter import messagebox, ttk, Canvas, Scrollbar
-import pyaudio
-import numpy as np
 import threading
 
+from audio_backends import BACKENDS, create_backend
+from audio_engine import RoutingEngine, StreamOpenError
+from device_registry import DeviceRegistry
+from latency import PROFILE_ORDER, LatencyAutoTuner
+from recorder import flac_available, recording_prefix
+from output_worker import QUEUE_POLICIES
+from telemetry import TelemetryLogger
+
 class AudioRouterApp:
-    def __init__(self, root):
+    def __init__(self, root, backend=None):
         self.root = root
         self.root.title("🎵 音频路由器 - Audio Router")
         self.root.geometry("900x600")
         self.root.configure(bg="#1e1e1e")
 
-        self.p = pyaudio.PyAudio()
-        self.input_streams = []
-        self.output_streams = []
+        self.backend = backend or create_backend()
         self.running = False
         self.sample_rate = 44100
         self.channels = 2
-        self.chunk = 1024
-        self.route_thread = None
+        # 设备能力缓存在 device_cache.json，之后启动不用再逐个探测
+        self.registry = DeviceRegistry(self.backend, "device_cache.json")
+        self.engine = RoutingEngine(self.backend, sample_rate=self.sample_rate, registry=self.registry)
+        self.engine.apply_profile('balanced')
+        self.tuner = None
+        self.engine.on_error = self.on_engine_error
         self.device_check_interval = 500  # ms
+        self.rescan_interval = 5000  # ms
+        self.rescanning = False
+        self.stats_log_path = "router_stats.jsonl"
+        self.stats_logger = None
+        self.recording_dir = "recordings"
 
-        # Get devices (use set to track unique devices)
-        self.input_devices = []
-        self.output_devices = []
-        seen_input = set()
-        seen_output = set()
-        for i in range(self.p.get_device_count()):
-            dev = self.p.get_device_info_by_index(i)
-            if dev['maxInputChannels'] > 0 and i not in seen_input:
-                self.input_devices.append((i, dev['name'], dev))
-                seen_input.add(i)
-            if dev['maxOutputChannels'] > 0 and i not in seen_output:
-                self.output_devices.append((i, dev['name'], dev))
-                seen_output.add(i)
+        # 设备行按 device_key 保存，热插拔时只增删变化的行
+        self.input_rows = {}
+        self.output_rows = {}
 
         # Create main container
         main_container = tk.Frame(root, bg="#1e1e1e")
@@ -76,19 +80,6 @@ class AudioRouterApp:
         input_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         input_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        # Add input devices
-        self.input_vars = []
-        for idx, name, dev in self.input_devices:
-            var = tk.BooleanVar()
-            var.trace_add('write', lambda *args: self.on_device_change())
-            self.input_vars.append((idx, var, dev))
-            device_frame = tk.Frame(self.input_scroll_frame, bg="#3d3d3d", relief=tk.FLAT, bd=1)
-            device_frame.pack(fill=tk.X, padx=5, pady=2)
-            cb = tk.Checkbutton(device_frame, text=f"[{idx}] {name}", variable=var,
-                               bg="#3d3d3d", fg="#ffffff", selectcolor="#0078d4",
-                               font=("Arial", 9), anchor="w", relief=tk.FLAT)
-            cb.pack(fill=tk.X, padx=5, pady=5)
-
         # Output devices section
         output_section = tk.Frame(devices_frame, bg="#2d2d2d", relief=tk.RAISED, bd=2)
         output_section.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
@@ -117,18 +108,9 @@ class AudioRouterApp:
         output_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         output_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        # Add output devices
-        self.output_vars = []
-        for idx, name, dev in self.output_devices:
-            var = tk.BooleanVar()
-            var.trace_add('write', lambda *args: self.on_device_change())
-            self.output_vars.append((idx, var, dev))
-            device_frame = tk.Frame(self.output_scroll_frame, bg="#3d3d3d", relief=tk.FLAT, bd=1)
-            device_frame.pack(fill=tk.X, padx=5, pady=2)
-            cb = tk.Checkbutton(device_frame, text=f"[{idx}] {name}", variable=var,
-                               bg="#3d3d3d", fg="#ffffff", selectcolor="#107c10",
-                               font=("Arial", 9), anchor="w", relief=tk.FLAT)
-            cb.pack(fill=tk.X, padx=5, pady=5)
+        # Add devices
+        for key, dev in self.registry.devices.items():
+            self.add_device_row(key, dev)
 
         # Control panel
         control_panel = tk.Frame(main_container, bg="#2d2d2d", relief=tk.RAISED, bd=2)
@@ -159,253 +141,373 @@ class AudioRouterApp:
                                      relief=tk.FLAT, padx=20, pady=10, cursor="hand2")
         self.stop_button.pack(side=tk.LEFT, padx=5)
 
+        tk.Button(button_frame, text="🎛️ 路由矩阵 Matrix",
+                  command=self.open_route_matrix,
+                  bg="#0078d4", fg="#ffffff", font=("Arial", 11, "bold"),
+                  relief=tk.FLAT, padx=20, pady=10, cursor="hand2").pack(side=tk.LEFT, padx=5)
+
+        tk.Button(button_frame, text="🎚️ 输入处理 DSP",
+                  command=self.open_dsp_settings,
+                  bg="#0078d4", fg="#ffffff", font=("Arial", 11, "bold"),
+                  relief=tk.FLAT, padx=20, pady=10, cursor="hand2").pack(side=tk.LEFT, padx=5)
+
+        self.record_button = tk.Button(button_frame, text="⏺ 录音 Rec",
+                                       command=self.toggle_recording, state=tk.DISABLED,
+                                       bg="#666666", fg="#ffffff", font=("Arial", 11, "bold"),
+                                       relief=tk.FLAT, padx=20, pady=10, cursor="hand2")
+        self.record_button.pack(side=tk.LEFT, padx=5)
+
+        # Output queue policy
+        tk.Label(button_frame, text="输出队列 Queue:", font=("Arial", 9),
+                bg="#2d2d2d", fg="#888888").pack(side=tk.LEFT, padx=(15, 5))
+        self.policy_var = tk.StringVar(value=self.engine.output_queue_policy)
+        policy_box = ttk.Combobox(button_frame, textvariable=self.policy_var, values=QUEUE_POLICIES,
+                                  state="readonly", width=12)
+        policy_box.bind("<<ComboboxSelected>>", lambda e: self.on_policy_change())
+        policy_box.pack(side=tk.LEFT)
+
+        # Latency profile
+        tk.Label(button_frame, text="延迟 Latency:", font=("Arial", 9),
+                bg="#2d2d2d", fg="#888888").pack(side=tk.LEFT, padx=(15, 5))
+        self.profile_var = tk.StringVar(value=self.engine.profile)
+        profile_box = ttk.Combobox(button_frame, textvariable=self.profile_var, values=PROFILE_ORDER + ('auto',),
+                                   state="readonly", width=10)
+        profile_box.bind("<<ComboboxSelected>>", lambda e: self.on_profile_change())
+        profile_box.pack(side=tk.LEFT)
+
+        self.log_stats_var = tk.BooleanVar()
+        tk.Checkbutton(button_frame, text="📝 统计日志 JSONL", variable=self.log_stats_var,
+                       command=self.on_log_stats_toggle, bg="#2d2d2d", fg="#888888",
+                       selectcolor="#3d3d3d", activebackground="#2d2d2d",
+                       font=("Arial", 9)).pack(side=tk.LEFT, padx=(15, 0))
+
+        # Engine telemetry
+        self.stats_label = tk.Label(control_panel, text="", font=("Consolas", 9), justify=tk.LEFT,
+                                    bg="#2d2d2d", fg="#888888")
+        self.stats_label.pack()
+
         # Info label
-        info_label = tk.Label(control_panel, 
-                             text=f"📊 发现 {len(self.input_devices)} 个输入设备 | {len(self.output_devices)} 个输出设备",
-                             font=("Arial", 9), bg="#2d2d2d", fg="#888888")
-        info_label.pack(pady=(0, 10))
-
-    def get_supported_rate(self, device_info, is_input=True):
-        """获取设备支持的采样率"""
-        rates = [44100, 48000, 32000, 22050, 16000, 8000]
-        for rate in rates:
-            try:
-                if is_input:
-                    if self.p.is_format_supported(rate,
-                                                  input_device=device_info['index'],
-                                                  input_channels=min(2, device_info['maxInputChannels']),
-                                                  input_format=pyaudio.paInt16):
-                        return rate, min(2, device_info['maxInputChannels'])
-                else:
-                    if self.p.is_format_supported(rate,
-                                                  output_device=device_info['index'],
-                                                  output_channels=min(2, device_info['maxOutputChannels']),
-                                                  output_format=pyaudio.paInt16):
-                        return rate, min(2, device_info['maxOutputChannels'])
-            except:
+        self.info_label = tk.Label(control_panel, text="", font=("Arial", 9), bg="#2d2d2d", fg="#888888")
+        self.info_label.pack(pady=(0, 10))
+        self.update_device_count()
+
+        # 后台探测还没有缓存的设备，并开始监视热插拔
+        threading.Thread(target=self.registry.warm, daemon=True).start()
+        self.root.after(self.rescan_interval, self.poll_devices)
+
+    def add_device_row(self, key, dev):
+        """为设备添加输入和/或输出勾选行"""
+        for rows, parent, max_key, color in ((self.input_rows, self.input_scroll_frame, 'maxInputChannels', "#0078d4"),
+                                             (self.output_rows, self.output_scroll_frame, 'maxOutputChannels', "#107c10")):
+            if dev[max_key] <= 0:
                 continue
-        return int(device_info.get('defaultSampleRate', 44100)), 1
+            var = tk.BooleanVar()
+            var.trace_add('write', lambda *args: self.on_device_change())
+            device_frame = tk.Frame(parent, bg="#3d3d3d", relief=tk.FLAT, bd=1)
+            device_frame.pack(fill=tk.X, padx=5, pady=2)
+            cb = tk.Checkbutton(device_frame, text=f"[{dev['index']}] {dev['name']}", variable=var,
+                               bg="#3d3d3d", fg="#ffffff", selectcolor=color,
+                               font=("Arial", 9), anchor="w", relief=tk.FLAT)
+            cb.pack(fill=tk.X, padx=5, pady=5)
+            rows[key] = {'dev': dev, 'var': var, 'frame': device_frame, 'checkbutton': cb}
+
+    def update_device_count(self):
+        self.info_label.config(text=f"📊 发现 {len(self.input_rows)} 个输入设备 | {len(self.output_rows)} 个输出设备")
+
+    def poll_devices(self):
+        """定时在后台重新枚举设备（PortAudio 重新初始化较慢，不能放在界面线程）"""
+        if not self.running and not self.rescanning:
+            self.rescanning = True
+            threading.Thread(target=self.rescan_devices, daemon=True).start()
+        self.root.after(self.rescan_interval, self.poll_devices)
+
+    def rescan_devices(self):
+        try:
+            changes = self.registry.rescan()
+        except Exception as e:
+            print(f"重新枚举设备错误: {e}")
+            changes = ([], [], [])
+        self.root.after(0, self.apply_device_changes, *changes)
+
+    def apply_device_changes(self, added, removed, changed):
+        """只更新变化的设备行，保留其它设备的勾选状态"""
+        self.rescanning = False
+        reselect = False
+        for key in removed:
+            for rows in (self.input_rows, self.output_rows):
+                row = rows.pop(key, None)
+                if row:
+                    reselect = reselect or row['var'].get()
+                    row['frame'].destroy()
+        for key in changed:
+            dev = self.registry.devices[key]
+            for rows in (self.input_rows, self.output_rows):
+                if key in rows:
+                    rows[key]['dev'] = dev
+                    rows[key]['checkbutton'].config(text=f"[{dev['index']}] {dev['name']}")
+        for key in added:
+            self.add_device_row(key, self.registry.devices[key])
+        if added or removed:
+            self.update_device_count()
+        if reselect:
+            self.on_device_change()
+
+    def get_selected_devices(self):
+        selected_inputs = [(row['dev']['index'], row['dev']['name'], row['dev'])
+                           for row in self.input_rows.values() if row['var'].get()]
+        selected_outputs = [(row['dev']['index'], row['dev']['name'], row['dev'])
+                            for row in self.output_rows.values() if row['var'].get()]
+        return selected_inputs, selected_outputs
 
     def start_routing(self):
-        input_selections = [(idx, dev) for idx, var, dev in self.input_vars if var.get()]
-        output_selections = [(idx, dev) for idx, var, dev in self.output_vars if var.get()]
+        selected_inputs, selected_outputs = self.get_selected_devices()
 
-        if not input_selections or not output_selections:
+        if not selected_inputs or not selected_outputs:
             messagebox.showerror("❌ 错误", "请至少选择一个输入和一个输出设备\nPlease select at least one input and one output device")
             return
 
-        selected_inputs = [(idx, name, dev) for idx, name, dev in self.input_devices if idx in [i[0] for i in input_selections]]
-        selected_outputs = [(idx, name, dev) for idx, name, dev in self.output_devices if idx in [i[0] for i in output_selections]]
-
         try:
-            # Create input streams
-            self.input_streams = []
-            for idx, name, dev in selected_inputs:
-                try:
-                    rate, channels = self.get_supported_rate(dev, is_input=True)
-                    stream = self.p.open(format=pyaudio.paInt16,
-                                       channels=channels,
-                                       rate=rate,
-                                       input=True,
-                                       input_device_index=idx,
-                                       frames_per_buffer=1024)
-                    self.input_streams.append((stream, rate, channels, idx))
-                except Exception as e:
-                    messagebox.showerror("❌ 输入设备错误", f"无法打开输入设备 [{idx}] {name}\n{str(e)}")
-                    self.cleanup_streams()
-                    return
-
-            # Create output streams
-            self.output_streams = []
-            for idx, name, dev in selected_outputs:
-                try:
-                    rate, channels = self.get_supported_rate(dev, is_input=False)
-                    stream = self.p.open(format=pyaudio.paInt16,
-                                       channels=channels,
-                                       rate=rate,
-                                       output=True,
-                                       output_device_index=idx,
-                                       frames_per_buffer=1024)
-                    self.output_streams.append((stream, rate, channels, idx))
-                except Exception as e:
-                    messagebox.showerror("❌ 输出设备错误", f"无法打开输出设备 [{idx}] {name}\n{str(e)}")
-                    self.cleanup_streams()
-                    return
-
-            self.running = True
-            self.start_button.config(state=tk.DISABLED, bg="#666666")
-            self.stop_button.config(state=tk.NORMAL, bg="#d32f2f")
-            self.status_label.config(text="▶ 运行中 Running", fg="#4caf50")
-
-            # Start routing thread
-            self.route_thread = threading.Thread(target=self.route_audio, daemon=True)
-            self.route_thread.start()
-        
+            self.engine.start(selected_inputs, selected_outputs)
+        except StreamOpenError as e:
+            if e.is_input:
+                messagebox.showerror("❌ 输入设备错误", f"无法打开输入设备 [{e.idx}] {e.name}\n{str(e)}")
+            else:
+                messagebox.showerror("❌ 输出设备错误", f"无法打开输出设备 [{e.idx}] {e.name}\n{str(e)}")
+            return
         except Exception as e:
             messagebox.showerror("❌ 错误", f"启动路由失败:\n{str(e)}")
-            self.cleanup_streams()
-    
-    def cleanup_streams(self):
-        """清理所有流"""
-        for item in self.input_streams:
-            try:
-                stream = item[0] if isinstance(item, tuple) else item
-                stream.stop_stream()
-                stream.close()
-            except:
-                pass
-        self.input_streams = []
-        
-        for item in self.output_streams:
-            try:
-                stream = item[0] if isinstance(item, tuple) else item
-                stream.stop_stream()
-                stream.close()
-            except:
-                pass
-        self.output_streams = []
-
-    def route_audio(self):
-        """实时音频路由线程"""
+            return
+
+        self.running = True
+        self.tuner = LatencyAutoTuner(self.engine) if self.profile_var.get() == 'auto' else None
+        self.start_button.config(state=tk.DISABLED, bg="#666666")
+        self.stop_button.config(state=tk.NORMAL, bg="#d32f2f")
+        self.record_button.config(state=tk.NORMAL, bg="#0078d4")
+        self.status_label.config(text="▶ 运行中 Running", fg="#4caf50")
+        self.refresh_status()
+
+    def open_route_matrix(self):
+        """打开路由矩阵窗口：行是输入设备，列是输出设备，单元格是增益（0 = 不路由）"""
+        selected_inputs, selected_outputs = self.get_selected_devices()
+        if not selected_inputs or not selected_outputs:
+            messagebox.showinfo("🎛️ 路由矩阵", "请先勾选输入和输出设备\nPlease select input and output devices first")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("🎛️ 路由矩阵 Routing Matrix")
+        window.configure(bg="#1e1e1e")
+        grid = tk.Frame(window, bg="#1e1e1e")
+        grid.pack(padx=15, pady=15)
+
+        tk.Label(grid, text="输入 \\ 输出", font=("Arial", 9, "bold"),
+                 bg="#1e1e1e", fg="#888888").grid(row=0, column=0, padx=5, pady=5)
+        for col, (out_idx, out_name, _) in enumerate(selected_outputs, 1):
+            tk.Label(grid, text=f"🔊 [{out_idx}] {out_name[:20]}", font=("Arial", 9),
+                     bg="#1e1e1e", fg="#4caf50").grid(row=0, column=col, padx=5, pady=5)
+
+        self.route_vars = []
+        for row, (in_idx, in_name, _) in enumerate(selected_inputs, 1):
+            tk.Label(grid, text=f"🎤 [{in_idx}] {in_name[:20]}", font=("Arial", 9),
+                     bg="#1e1e1e", fg="#0078d4", anchor="w").grid(row=row, column=0, sticky="w", padx=5, pady=3)
+            for col, (out_idx, _, _) in enumerate(selected_outputs, 1):
+                var = tk.StringVar(value=f"{self.engine.routes.gain(in_idx, out_idx):.1f}")
+                var.trace_add('write', lambda *args, i=in_idx, o=out_idx, v=var: self.on_route_gain_change(i, o, v))
+                tk.Spinbox(grid, from_=0.0, to=4.0, increment=0.1, textvariable=var, width=6,
+                           bg="#3d3d3d", fg="#ffffff", buttonbackground="#3d3d3d",
+                           relief=tk.FLAT).grid(row=row, column=col, padx=5, pady=3)
+                # 保存引用，防止 StringVar 被回收
+                self.route_vars.append(var)
+
+    def on_route_gain_change(self, in_idx, out_idx, var):
         try:
-            while self.running:
-                # Read from all inputs
-                inputs_data = []
-                for item in self.input_streams:
-                    stream, rate, channels = item[0], item[1], item[2]
-                    try:
-                        data = stream.read(1024, exception_on_overflow=False)
-                        audio_array = np.frombuffer(data, dtype=np.int16)
-                        # Convert to mono if stereo
-                        if channels == 2 and len(audio_array) > 0:
-                            audio_array = audio_array.reshape(-1, 2).mean(axis=1).astype(np.int16)
-                        inputs_data.append(audio_array)
-                    except Exception as e:
-                        print(f"读取输入流错误: {e}")
-                        continue
-
-                # Mix (average)
-                if inputs_data:
-                    # Find minimum length
-                    min_len = min(len(d) for d in inputs_data)
-                    if min_len > 0:
-                        # Truncate all to same length
-                        inputs_data = [d[:min_len] for d in inputs_data]
-                        mixed = np.mean(inputs_data, axis=0).astype(np.int16)
-                        
-                        # Write to all outputs
-                        for item in self.output_streams:
-                            stream, rate, channels = item[0], item[1], item[2]
-                            try:
-                                # Convert mono to stereo if needed
-                                if channels == 2:
-                                    stereo_data = np.column_stack((mixed, mixed)).flatten()
-                                    stream.write(stereo_data.tobytes())
-                                else:
-                                    stream.write(mixed.tobytes())
-                            except Exception as e:
-                                print(f"写入输出流错误: {e}")
-                                continue
+            gain = float(var.get())
+        except ValueError:
+            return
+        self.engine.set_route_gain(in_idx, out_idx, max(0.0, gain))
+
+    def open_dsp_settings(self):
+        """打开输入处理窗口：每个输入一行，增益（dB）、噪声门、80 Hz 高通，修改后立即生效"""
+        selected_inputs, _ = self.get_selected_devices()
+        if not selected_inputs:
+            messagebox.showinfo("🎚️ 输入处理", "请先勾选输入设备\nPlease select input devices first")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("🎚️ 输入处理 Input DSP")
+        window.configure(bg="#1e1e1e")
+        grid = tk.Frame(window, bg="#1e1e1e")
+        grid.pack(padx=15, pady=15)
+        for col, text in enumerate(("输入", "增益 dB", "噪声门 Gate", "高通 HPF")):
+            tk.Label(grid, text=text, font=("Arial", 9, "bold"),
+                     bg="#1e1e1e", fg="#888888").grid(row=0, column=col, padx=5, pady=5)
+
+        self.dsp_vars = []
+        for row, (in_idx, in_name, _) in enumerate(selected_inputs, 1):
+            specs = {spec['type']: spec for spec in self.engine.dsp.get(in_idx, [])}
+            tk.Label(grid, text=f"🎤 [{in_idx}] {in_name[:24]}", font=("Arial", 9),
+                     bg="#1e1e1e", fg="#0078d4", anchor="w").grid(row=row, column=0, sticky="w", padx=5, pady=3)
+            gain_var = tk.StringVar(value=f"{specs.get('gain', {}).get('db', 0.0):.1f}")
+            gate_var = tk.BooleanVar(value='gate' in specs)
+            hpf_var = tk.BooleanVar(value='highpass' in specs)
+            update = lambda *args, i=in_idx, g=gain_var, n=gate_var, h=hpf_var: self.on_dsp_change(i, g, n, h)
+            gain_var.trace_add('write', update)
+            tk.Spinbox(grid, from_=-24.0, to=24.0, increment=1.0, textvariable=gain_var, width=6,
+                       bg="#3d3d3d", fg="#ffffff", buttonbackground="#3d3d3d",
+                       relief=tk.FLAT).grid(row=row, column=1, padx=5, pady=3)
+            for col, var in ((2, gate_var), (3, hpf_var)):
+                tk.Checkbutton(grid, variable=var, command=update, bg="#1e1e1e",
+                               selectcolor="#3d3d3d", activebackground="#1e1e1e").grid(row=row, column=col)
+            # 保存引用，防止变量被回收
+            self.dsp_vars.extend((gain_var, gate_var, hpf_var))
+
+    def on_dsp_change(self, in_idx, gain_var, gate_var, hpf_var):
+        try:
+            db = float(gain_var.get())
+        except ValueError:
+            return
+        # 先高通去掉低频噪声和直流，再按电平开关噪声门，最后调整增益
+        specs = []
+        if hpf_var.get():
+            specs.append({'type': 'highpass', 'cutoff': 80})
+        if gate_var.get():
+            specs.append({'type': 'gate', 'threshold_db': -50})
+        if db:
+            specs.append({'type': 'gain', 'db': db})
+        self.engine.set_input_chain(in_idx, specs)
+
+    def on_policy_change(self):
+        """队列策略对之后打开的输出生效"""
+        self.engine.output_queue_policy = self.policy_var.get()
+
+    def on_profile_change(self):
+        """切换延迟档位；auto 从最小档位开始，出现 xrun 时自动升级。运行中会重新打开所有流"""
+        profile = self.profile_var.get()
+        name = PROFILE_ORDER[0] if profile == 'auto' else profile
+        self.tuner = None
+        if not self.running:
+            self.engine.apply_profile(name)
+            return
+        # 运行中由 restart() 在停止混音线程之后切换档位
+        try:
+            self.engine.restart(name)
+        except Exception as e:
+            messagebox.showerror("❌ 错误", f"重新启动路由失败:\n{str(e)}")
+            self.stop_routing()
+            return
+        self.tuner = LatencyAutoTuner(self.engine) if profile == 'auto' else None
+        self.update_record_button()
+
+    def update_record_button(self):
+        """按引擎中实际的录音状态显示录音按钮（重新打开流时录音可能没能继续）"""
+        if self.engine.taps:
+            self.record_button.config(text="⏹ 停止录音", bg="#d32f2f")
+        else:
+            self.record_button.config(text="⏺ 录音 Rec", bg="#0078d4")
+
+    def toggle_recording(self):
+        """开始/停止录制每个输出的混音总线（recordings 目录，有 soundfile 时为 FLAC）"""
+        if self.engine.taps:
+            self.engine.stop_recording()
+            self.update_record_button()
+            return
+        fmt = 'flac' if flac_available() else 'wav'
+        try:
+            for out in self.engine.output_streams:
+                self.engine.start_recording('output', out.idx, recording_prefix(self.recording_dir, f"mix_out{out.idx}"),
+                                            format=fmt, rotate_seconds=3600)
         except Exception as e:
-            print(f"路由线程错误: {e}")
-            self.running = False
-            self.root.after(0, self.stop_routing)
+            self.engine.stop_recording()
+            messagebox.showerror("❌ 错误", f"无法开始录音:\n{str(e)}")
+            return
+        self.update_record_button()
+
+    def on_log_stats_toggle(self):
+        """开关统计日志：每秒追加一行 JSON 到 router_stats.jsonl"""
+        if self.log_stats_var.get():
+            self.stats_logger = TelemetryLogger(self.engine.snapshot, self.stats_log_path)
+        elif self.stats_logger:
+            self.stats_logger.stop()
+            self.stats_logger = None
+
+    def refresh_status(self):
+        """定时刷新引擎统计：chunk 耗时、各阶段耗时、每个设备的 xrun 和缓冲区填充"""
+        if not self.running:
+            self.stats_label.config(text="")
+            return
+        if self.tuner:
+            try:
+                self.tuner.check()
+            except Exception as e:
+                messagebox.showerror("❌ 错误", f"调整延迟档位失败:\n{str(e)}")
+                self.stop_routing()
+                return
+        # 升档重启、移除设备都可能结束录音
+        self.update_record_button()
+        stats = self.engine.snapshot()
+        timing = stats['timing']
+        lines = [
+            f"⏱ {stats['profile']} (chunk {stats['chunk']})"
+            f"  p50 {timing['chunk']['p50_ms']:.2f}ms  p99 {timing['chunk']['p99_ms']:.2f}ms"
+            f"  max {timing['chunk']['max_ms']:.2f}ms  / 预算 {stats['budget_ms']:.1f}ms"
+            f"  | 读 {timing['read']['mean_ms']:.2f} (处理 {timing['dsp']['mean_ms']:.2f})"
+            f"  混 {timing['mix']['mean_ms']:.2f}"
+            f"  写 {timing['write']['mean_ms']:.2f} ms"
+        ]
+        for inp in stats['inputs']:
+            lines.append(f"🎤[{inp['idx']}] 填充 {inp['fill']:4.0%} ({inp['latency_ms']:.0f}ms)"
+                         f"  溢出 {inp['overflows']}  缺帧 {inp['misses']}  丢弃 {inp['drops']}"
+                         + self.format_drift(inp) + self.format_meter(inp))
+        for out in stats['outputs']:
+            lines.append(f"🔊[{out['idx']}] 队列 {out['queue']}/{out['queue_capacity']}"
+                         f"  丢弃 {out['dropped']}  欠载 {out['underflows'] + out['underruns']}"
+                         f"  写入 p99 {out['write']['p99_ms']:.1f}ms" + self.format_drift(out))
+        for rec in stats['recordings']:
+            lines.append(f"⏺ {rec['kind']}[{rec['idx']}] {rec['bytes'] / 1e6:.1f}MB  {len(rec['files'])} 个文件"
+                         f"  丢弃 {rec['dropped']} 块")
+        if stats['routes']:
+            lines.append("🔁 " + "  ".join(f"[{route['input']}]→[{route['output']}] {route['latency_ms']:.0f}ms"
+                                           for route in stats['routes']))
+        self.stats_label.config(text="\n".join(lines))
+        self.root.after(self.device_check_interval, self.refresh_status)
+
+    def format_drift(self, stats):
+        """设备时钟相对引擎的偏差（ppm），未开启漂移补偿时为空"""
+        if stats['drift_ppm'] is None:
+            return ""
+        return f"  时钟 {stats['drift_ppm']:+.0f}ppm"
+
+    def format_meter(self, stats):
+        """电平表：各声道中最大的峰值 / RMS（dBFS），随状态栏每 500ms 刷新一次"""
+        if stats['peak_db'] is None:
+            return ""
+        return f"  电平 {max(stats['peak_db']):.0f}/{max(stats['rms_db']):.0f}dB"
+
+    def on_engine_error(self, error):
+        """路由线程出错时由引擎调用（非 Tk 线程）"""
+        self.root.after(0, self.stop_routing)
 
     def on_device_change(self):
         """设备选择变化时调用"""
         if self.running:
-            # 在后台更新流，不中断音频
-            threading.Thread(target=self.update_streams, daemon=True).start()
-    
-    def update_streams(self):
-        """动态更新音频流"""
-        try:
-            input_selections = [(idx, dev) for idx, var, dev in self.input_vars if var.get()]
-            output_selections = [(idx, dev) for idx, var, dev in self.output_vars if var.get()]
-            
-            if not input_selections or not output_selections:
+            # 交给引擎的重配置线程，在 chunk 边界切换，不中断其它设备的音频
+            selected_inputs, selected_outputs = self.get_selected_devices()
+            if not selected_inputs or not selected_outputs:
                 return
-            
-            selected_inputs = [(idx, name, dev) for idx, name, dev in self.input_devices if idx in [i[0] for i in input_selections]]
-            selected_outputs = [(idx, name, dev) for idx, name, dev in self.output_devices if idx in [i[0] for i in output_selections]]
-            
-            # 获取当前流的设备ID
-            current_input_ids = set()
-            current_output_ids = set()
-            
-            # 关闭不需要的输入流
-            new_input_streams = []
-            for item in self.input_streams:
-                stream, rate, channels, dev_idx = item if len(item) == 4 else (*item, None)
-                if dev_idx in [idx for idx, _, _ in selected_inputs]:
-                    new_input_streams.append((stream, rate, channels, dev_idx))
-                    current_input_ids.add(dev_idx)
-                else:
-                    try:
-                        stream.stop_stream()
-                        stream.close()
-                    except:
-                        pass
-            self.input_streams = new_input_streams
-            
-            # 添加新的输入流
-            for idx, name, dev in selected_inputs:
-                if idx not in current_input_ids:
-                    try:
-                        rate, channels = self.get_supported_rate(dev, is_input=True)
-                        stream = self.p.open(format=pyaudio.paInt16,
-                                           channels=channels,
-                                           rate=rate,
-                                           input=True,
-                                           input_device_index=idx,
-                                           frames_per_buffer=1024)
-                        self.input_streams.append((stream, rate, channels, idx))
-                    except:
-                        pass
-            
-            # 关闭不需要的输出流
-            new_output_streams = []
-            for item in self.output_streams:
-                stream, rate, channels, dev_idx = item if len(item) == 4 else (*item, None)
-                if dev_idx in [idx for idx, _, _ in selected_outputs]:
-                    new_output_streams.append((stream, rate, channels, dev_idx))
-                    current_output_ids.add(dev_idx)
-                else:
-                    try:
-                        stream.stop_stream()
-                        stream.close()
-                    except:
-                        pass
-            self.output_streams = new_output_streams
-            
-            # 添加新的输出流
-            for idx, name, dev in selected_outputs:
-                if idx not in current_output_ids:
-                    try:
-                        rate, channels = self.get_supported_rate(dev, is_input=False)
-                        stream = self.p.open(format=pyaudio.paInt16,
-                                           channels=channels,
-                                           rate=rate,
-                                           output=True,
-                                           output_device_index=idx,
-                                           frames_per_buffer=1024)
-                        self.output_streams.append((stream, rate, channels, idx))
-                    except:
-                        pass
-        except Exception as e:
-            print(f"更新流错误: {e}")
-    
+            self.engine.request_update(selected_inputs, selected_outputs)
+
     def stop_routing(self):
         """停止音频路由"""
         self.running = False
-        if self.route_thread:
-            self.route_thread.join(timeout=1)
-        self.cleanup_streams()
+        self.engine.stop()
+        self.record_button.config(text="⏺ 录音 Rec", state=tk.DISABLED, bg="#666666")
         self.start_button.config(state=tk.NORMAL, bg="#107c10")
         self.stop_button.config(state=tk.DISABLED, bg="#666666")
         self.status_label.config(text="⏸ 停止 Stopped", fg="#ff6b6b")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="音频路由器 Audio Router")
+    parser.add_argument("--backend", choices=BACKENDS, help="音频后端（默认自动选择 PyAudio / sounddevice）")
+    args = parser.parse_args()
     root = tk.Tk()
-    app = AudioRouterApp(root)
+    app = AudioRouterApp(root, create_backend(args.backend))
     root.mainloop()
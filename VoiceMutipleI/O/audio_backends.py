@@ -0,0 +1,445 @@
+import threading
+import time
+
+import numpy as np
+
+BACKENDS = ('pyaudio', 'sounddevice', 'fake')
+
+
+class AudioBackend:
+    """音频后端接口
+
+    设备信息统一使用 PyAudio 风格的字典（index / name / maxInputChannels /
+    maxOutputChannels / defaultSampleRate / hostApi）。所有流都是 int16 交错帧：
+
+    - open_input(...) 在后端线程中调用 callback(data, overflowed)，data 为支持缓冲区协议的对象
+    - open_output(...) 返回的流提供阻塞的 write(data)，返回值表示设备是否发生过欠载
+    - 两种流都提供 close()，以及返回设备自身缓冲延迟（秒）的 latency()
+
+    refresh() 让下一次 list_devices() 能看到热插拔的设备，不能刷新时返回 False。
+    """
+
+    name = None
+
+    def list_devices(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        return True
+
+    def is_format_supported(self, device_index, rate, channels, is_input):
+        raise NotImplementedError
+
+    def open_input(self, device_index, rate, channels, frames_per_buffer, callback):
+        raise NotImplementedError
+
+    def open_output(self, device_index, rate, channels, frames_per_buffer):
+        raise NotImplementedError
+
+    def terminate(self):
+        pass
+
+
+class PyAudioBackend(AudioBackend):
+    name = 'pyaudio'
+
+    def __init__(self):
+        import pyaudio
+        self.pyaudio = pyaudio
+        self.p = pyaudio.PyAudio()
+        self.open_streams = 0
+
+    def list_devices(self):
+        devices = []
+        for i in range(self.p.get_device_count()):
+            dev = self.p.get_device_info_by_index(i)
+            dev['hostApiName'] = self.p.get_host_api_info_by_index(dev['hostApi'])['name']
+            devices.append(dev)
+        return devices
+
+    def refresh(self):
+        # PortAudio 只在初始化时枚举设备；有流打开时不能重新初始化
+        if self.open_streams:
+            return False
+        self.p.terminate()
+        self.p = self.pyaudio.PyAudio()
+        return True
+
+    def is_format_supported(self, device_index, rate, channels, is_input):
+        try:
+            if is_input:
+                return self.p.is_format_supported(rate, input_device=device_index, input_channels=channels,
+                                                  input_format=self.pyaudio.paInt16)
+            return self.p.is_format_supported(rate, output_device=device_index, output_channels=channels,
+                                              output_format=self.pyaudio.paInt16)
+        except ValueError:
+            return False
+
+    def open_input(self, device_index, rate, channels, frames_per_buffer, callback):
+        pa = self.pyaudio
+
+        def stream_callback(in_data, frame_count, time_info, status):
+            callback(in_data, bool(status & pa.paInputOverflow))
+            return (None, pa.paContinue)
+
+        stream = self.p.open(format=pa.paInt16,
+                             channels=channels,
+                             rate=rate,
+                             input=True,
+                             input_device_index=device_index,
+                             frames_per_buffer=frames_per_buffer,
+                             stream_callback=stream_callback)
+        return _PyAudioStream(self, stream, True)
+
+    def open_output(self, device_index, rate, channels, frames_per_buffer):
+        pa = self.pyaudio
+        stream = self.p.open(format=pa.paInt16,
+                             channels=channels,
+                             rate=rate,
+                             output=True,
+                             output_device_index=device_index,
+                             frames_per_buffer=frames_per_buffer)
+        return _PyAudioStream(self, stream, False)
+
+    def terminate(self):
+        self.p.terminate()
+
+
+class _PyAudioStream:
+    def __init__(self, backend, stream, is_input):
+        self.backend = backend
+        self.stream = stream
+        self.pa = backend.pyaudio
+        self.is_input = is_input
+        backend.open_streams += 1
+
+    def latency(self):
+        if self.stream is None:
+            return 0.0
+        return self.stream.get_input_latency() if self.is_input else self.stream.get_output_latency()
+
+    def write(self, data):
+        # PyAudio 的 write 只接受 bytes；欠载在数据写完后才以 IOError 报告
+        try:
+            self.stream.write(bytes(data), exception_on_underflow=True)
+        except IOError as e:
+            if e.errno == self.pa.paOutputUnderflowed:
+                return True
+            raise
+        return False
+
+    def close(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        except:
+            pass
+        self.stream = None
+        self.backend.open_streams -= 1
+
+
+class SoundDeviceBackend(AudioBackend):
+    name = 'sounddevice'
+
+    def __init__(self):
+        import sounddevice
+        self.sd = sounddevice
+        self.open_streams = 0
+
+    def list_devices(self):
+        hostapis = self.sd.query_hostapis()
+        devices = []
+        for i, dev in enumerate(self.sd.query_devices()):
+            devices.append({
+                'index': i,
+                'name': dev['name'],
+                'maxInputChannels': dev['max_input_channels'],
+                'maxOutputChannels': dev['max_output_channels'],
+                'defaultSampleRate': dev['default_samplerate'],
+                'hostApi': dev['hostapi'],
+                'hostApiName': hostapis[dev['hostapi']]['name'],
+                'defaultLowInputLatency': dev['default_low_input_latency'],
+                'defaultHighInputLatency': dev['default_high_input_latency'],
+                'defaultLowOutputLatency': dev['default_low_output_latency'],
+                'defaultHighOutputLatency': dev['default_high_output_latency'],
+            })
+        return devices
+
+    def refresh(self):
+        if self.open_streams:
+            return False
+        self.sd._terminate()
+        self.sd._initialize()
+        return True
+
+    def is_format_supported(self, device_index, rate, channels, is_input):
+        check = self.sd.check_input_settings if is_input else self.sd.check_output_settings
+        try:
+            check(device=device_index, channels=channels, dtype='int16', samplerate=rate)
+            return True
+        except Exception:
+            return False
+
+    def open_input(self, device_index, rate, channels, frames_per_buffer, callback):
+        def stream_callback(indata, frames, time_info, status):
+            callback(indata, bool(status.input_overflow))
+
+        stream = self.sd.RawInputStream(samplerate=rate, blocksize=frames_per_buffer, device=device_index,
+                                        channels=channels, dtype='int16', callback=stream_callback)
+        stream.start()
+        return _SoundDeviceStream(self, stream)
+
+    def open_output(self, device_index, rate, channels, frames_per_buffer):
+        stream = self.sd.RawOutputStream(samplerate=rate, blocksize=frames_per_buffer, device=device_index,
+                                         channels=channels, dtype='int16')
+        stream.start()
+        return _SoundDeviceStream(self, stream)
+
+
+class _SoundDeviceStream:
+    def __init__(self, backend, stream):
+        self.backend = backend
+        self.stream = stream
+        backend.open_streams += 1
+
+    def latency(self):
+        return self.stream.latency if self.stream is not None else 0.0
+
+    def write(self, data):
+        # RawOutputStream.write 直接接受缓冲区对象，返回是否欠载
+        return self.stream.write(data)
+
+    def close(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.stop()
+            self.stream.close()
+        except:
+            pass
+        self.stream = None
+        self.backend.open_streams -= 1
+
+
+class FakeDevice:
+    """虚拟设备描述：ppm 为设备时钟相对标称采样率的偏差，输入产生正弦波"""
+
+    def __init__(self, name, max_input_channels=0, max_output_channels=0, rate=48000, ppm=0.0,
+                 frequency=440.0, amplitude=0.25):
+        self.name = name
+        self.max_input_channels = max_input_channels
+        self.max_output_channels = max_output_channels
+        self.rate = rate
+        self.ppm = ppm
+        self.frequency = frequency
+        self.amplitude = amplitude
+
+
+def default_fake_devices():
+    return [
+        FakeDevice("Fake Mic 440Hz", max_input_channels=1, rate=48000, frequency=440.0),
+        FakeDevice("Fake Music 660Hz", max_input_channels=2, rate=44100, frequency=660.0),
+        FakeDevice("Fake Speakers", max_output_channels=2, rate=48000),
+        FakeDevice("Fake Headset", max_output_channels=1, rate=44100),
+    ]
+
+
+class SimClock:
+    """模拟时钟：advance() 推进时间并按各设备的实际速率驱动所有虚拟流"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._streams = []
+        self._lock = threading.Lock()
+
+    def register(self, stream):
+        with self._lock:
+            self._streams.append(stream)
+
+    def unregister(self, stream):
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    def advance(self, seconds):
+        with self._lock:
+            self.now += seconds
+            streams = list(self._streams)
+        for stream in streams:
+            stream.tick(seconds)
+
+
+class FakeBackend(AudioBackend):
+    """内存中的虚拟后端，不需要声卡
+
+    realtime=True 时后台线程按墙上时间推进时钟，可以直接替代真实后端运行；
+    realtime=False 时由调用方 clock.advance() 手动推进，适合测试和基准。
+    capture=True 时每个输出保存它播放过的所有帧。
+    """
+
+    name = 'fake'
+
+    def __init__(self, devices=None, realtime=True, capture=False, tick=0.002):
+        self.devices = devices if devices is not None else default_fake_devices()
+        self.clock = SimClock()
+        self.capture = capture
+        self.streams = []
+        self._running = realtime
+        self._thread = None
+        if realtime:
+            self._thread = threading.Thread(target=self._run_clock, args=(tick,), daemon=True)
+            self._thread.start()
+
+    def _run_clock(self, tick):
+        last = time.perf_counter()
+        while self._running:
+            time.sleep(tick)
+            now = time.perf_counter()
+            self.clock.advance(now - last)
+            last = now
+
+    def list_devices(self):
+        return [{
+            'index': i,
+            'name': dev.name,
+            'maxInputChannels': dev.max_input_channels,
+            'maxOutputChannels': dev.max_output_channels,
+            'defaultSampleRate': float(dev.rate),
+            'hostApi': 0,
+            'hostApiName': 'Fake',
+        } for i, dev in enumerate(self.devices)]
+
+    def plug(self, device):
+        """模拟热插拔：加入一个设备（新设备排在最后）"""
+        self.devices = self.devices + [device]
+
+    def unplug(self, name):
+        """模拟拔出：移除设备，排在它后面的设备索引前移，与真实后端重新枚举一致"""
+        self.devices = [dev for dev in self.devices if dev.name != name]
+
+    def is_format_supported(self, device_index, rate, channels, is_input):
+        dev = self.devices[device_index]
+        max_channels = dev.max_input_channels if is_input else dev.max_output_channels
+        return rate == dev.rate and 0 < channels <= max_channels
+
+    def open_input(self, device_index, rate, channels, frames_per_buffer, callback):
+        stream = FakeInputStream(self, self.devices[device_index], channels, frames_per_buffer, callback)
+        self.clock.register(stream)
+        self.streams.append(stream)
+        return stream
+
+    def open_output(self, device_index, rate, channels, frames_per_buffer):
+        stream = FakeOutputStream(self, self.devices[device_index], channels, frames_per_buffer, self.capture)
+        self.clock.register(stream)
+        self.streams.append(stream)
+        return stream
+
+    def terminate(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+        for stream in list(self.streams):
+            stream.close()
+
+
+class FakeInputStream:
+    """按设备时钟产生正弦波，每凑够 frames_per_buffer 帧回调一次"""
+
+    def __init__(self, backend, device, channels, frames_per_buffer, callback):
+        self.backend = backend
+        self.device = device
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.speed = device.rate * (1 + device.ppm * 1e-6)
+        self.produced = 0
+        self._pending = 0.0
+        self._omega = 2 * np.pi * device.frequency / device.rate
+
+    def latency(self):
+        return self.frames_per_buffer / self.device.rate
+
+    def tick(self, seconds):
+        self._pending += seconds * self.speed
+        while self._pending >= self.frames_per_buffer:
+            self._pending -= self.frames_per_buffer
+            n = np.arange(self.produced, self.produced + self.frames_per_buffer)
+            wave = self.device.amplitude * 32767 * np.sin(self._omega * n)
+            block = np.repeat(wave[:, None], self.channels, axis=1).astype(np.int16)
+            self.produced += self.frames_per_buffer
+            self.callback(block, False)
+
+    def close(self):
+        self.backend.clock.unregister(self)
+
+
+class FakeOutputStream:
+    """按设备时钟消耗帧的虚拟输出；设备缓冲区满时 write() 阻塞，与真实设备一致"""
+
+    def __init__(self, backend, device, channels, frames_per_buffer, capture):
+        self.backend = backend
+        self.device = device
+        self.channels = channels
+        self.capacity = 2 * frames_per_buffer
+        self.speed = device.rate * (1 + device.ppm * 1e-6)
+        self.pending = 0
+        self.consumed = 0
+        self.underflows = 0
+        self.captured = [] if capture else None
+        self._underflowed = False
+        self._fraction = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def latency(self):
+        return self.capacity / self.device.rate
+
+    def tick(self, seconds):
+        with self._cond:
+            self._fraction += seconds * self.speed
+            frames = int(self._fraction)
+            self._fraction -= frames
+            if frames > self.pending:
+                if self.consumed:
+                    self._underflowed = True
+                    self.underflows += 1
+                frames = self.pending
+            self.pending -= frames
+            self.consumed += frames
+            self._cond.notify_all()
+
+    def write(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples) // self.channels
+        with self._cond:
+            while self.pending and self.pending + n > self.capacity and not self._closed:
+                self._cond.wait(0.05)
+            self.pending += n
+            if self.captured is not None:
+                self.captured.append(samples.reshape(-1, self.channels).copy())
+            underflowed, self._underflowed = self._underflowed, False
+            return underflowed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.backend.clock.unregister(self)
+
+
+def create_backend(name=None, **kwargs):
+    """按名称创建后端；name 为 None 时依次尝试 PyAudio 和 sounddevice"""
+    if name == 'pyaudio':
+        return PyAudioBackend()
+    if name == 'sounddevice':
+        return SoundDeviceBackend()
+    if name == 'fake':
+        return FakeBackend(**kwargs)
+    if name is not None:
+        raise ValueError(f"未知的音频后端: {name}")
+    try:
+        return PyAudioBackend()
+    except ImportError:
+        return SoundDeviceBackend()
@@ -0,0 +1,686 @@
+import threading
+import time
+
+import numpy as np
+
+from device_registry import DeviceRegistry
+from drift import DriftEstimator
+from dsp import DspChain
+from latency import LATENCY_PROFILES
+from mixer import Mixer, PcmBuffer, fade_in_curve, int16_to_float, remap_gains
+from output_worker import OutputWorker
+from recorder import RecordingTap
+from resampler import Resampler
+from routing_matrix import RoutingMatrix
+from telemetry import EngineTelemetry
+
+
+class StreamOpenError(Exception):
+    """打开音频流失败（携带设备信息，便于界面提示）"""
+
+    def __init__(self, is_input, idx, name, error):
+        super().__init__(str(error))
+        self.is_input = is_input
+        self.idx = idx
+        self.name = name
+
+
+class RingBuffer:
+    """预分配的单生产者/单消费者环形缓冲区（int16 交错帧）
+
+    生产者（PortAudio 回调）只推进写指针，消费者（混音线程）只推进读指针，
+    因此两端无需加锁。
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self.channels = channels
+        self._buf = np.zeros((capacity, channels), dtype=np.int16)
+        self._read = 0
+        self._write = 0
+        self.overflows = 0
+
+    def available(self):
+        return self._write - self._read
+
+    def write(self, frames):
+        """由回调线程写入；缓冲区已满时丢弃新数据并计数"""
+        n = min(len(frames), self.capacity - self.available())
+        if n < len(frames):
+            self.overflows += 1
+        if n <= 0:
+            return
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = frames[:first]
+        if first < n:
+            self._buf[:n - first] = frames[first:n]
+        self._write += n
+
+    def read_into(self, out):
+        """读取 len(out) 帧到预分配的 out 中"""
+        n = len(out)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        if first < n:
+            out[first:] = self._buf[:n - first]
+        self._read += n
+
+    def skip(self, n):
+        """丢弃最旧的 n 帧（由消费者调用，用于限制延迟）"""
+        self._read += min(n, self.available())
+
+
+class InputStream:
+    """回调驱动的输入流，音频被写入自己的环形缓冲区
+
+    混音时按需取出设备采样率下的帧，经 resampler 转换为引擎采样率的 chunk。
+    缓冲区先预填到 target_fill 帧才开始参与混音；开启漂移补偿时，drift 根据
+    填充量相对 target_fill 的偏差微调 resampler.ratio，使延迟长期保持在目标值。
+
+    chain 是该输入的处理链（DspChain），在重采样后、混音前原地处理 Mixer 中的输入视图。
+    next_chain 是要切换到的处理链：混音线程在下一个 chunk 里新旧两条链各处理一遍，
+    按升余弦曲线交叉淡化后改用新链，避免滤波器状态清零和增益突变造成的爆音。
+    """
+
+    def __init__(self, idx, rate, channels, chunk, ring_chunks, engine_rate, drift_compensation=True,
+                 headroom=1.5):
+        self.idx = idx
+        self.rate = rate
+        self.channels = channels
+        self.resampler = Resampler(rate, engine_rate, channels, adaptive=drift_compensation)
+        self.drift = DriftEstimator(chunk / engine_rate) if drift_compensation else None
+        nominal = int(np.ceil(chunk * rate / engine_rate))
+        self.frames = nominal
+        max_needed = int(nominal * 1.01) + self.resampler.taps + 1
+        # 读取前的平均填充量：本次所需帧数 + headroom 个设备块的余量，吸收回调时机的抖动
+        self.target_fill = nominal + self.resampler.taps + int(headroom * chunk)
+        self.max_fill = self.target_fill + 2 * chunk
+        self.ring = RingBuffer(max(max_needed * ring_chunks, self.max_fill + 2 * chunk), channels)
+        self.buffer = np.zeros((max_needed, channels), dtype=np.int16)
+        self.work = np.zeros((max_needed, channels), dtype=np.float32)
+        self.stream = None
+        self.chain = None
+        self.next_chain = None
+        self._fade_work = np.zeros((chunk, channels), dtype=np.float32)
+        self._fade_in = fade_in_curve(chunk)
+        self.primed = False
+        self.overflows = 0
+        self.misses = 0
+        self.drops = 0
+
+    def close(self):
+        self.stream.close()
+
+    def latency(self):
+        """输入侧延迟估计（秒）：设备缓冲 + 环形缓冲区平均等待时间 + 重采样群延迟"""
+        fill = self.ring.available()
+        if self.drift and self.drift.error is not None:
+            # 控制器平滑后的读取前填充量，比瞬时值稳定
+            fill = self.target_fill + self.drift.error * self.rate
+        return self.stream.latency() + max(0.0, fill - self.frames / 2) / self.rate + self.resampler.delay()
+
+    def process_chain(self, x):
+        """在混音线程中原地处理 x（Mixer 中的输入视图），返回耗时（秒）"""
+        chain, target = self.chain, self.next_chain
+        if target is chain or chain is None:
+            self.chain = target
+            return target.process(x) if target is not None else 0.0
+        # 切换处理链：同一段音频分别经旧链和新链处理，x = old + fade_in * (new - old)
+        work = self._fade_work[:len(x)]
+        np.copyto(work, x)
+        elapsed = chain.process(x) + target.process(work)
+        work -= x
+        work *= self._fade_in[:len(x)]
+        x += work
+        self.chain = target
+        return elapsed
+
+    def callback(self, data, overflowed):
+        """由后端的音频线程调用"""
+        if overflowed:
+            self.overflows += 1
+        frames = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+        self.ring.write(frames)
+
+
+class OutputStream:
+    """输出流：混音结果先从引擎采样率转换到设备采样率，再交给独立的写入线程
+
+    开启漂移补偿时，drift 根据写入队列中积压的帧数相对 target_fill 的偏差
+    微调 resampler.ratio：设备比引擎快时队列变短，每个 chunk 就多产生一些帧。
+    """
+
+    def __init__(self, idx, rate, channels, stream, engine_rate, chunk, queue_depth, queue_policy,
+                 drift_compensation=True, target_blocks=1.5):
+        self.idx = idx
+        self.rate = rate
+        self.channels = channels
+        self.stream = stream
+        self.resampler = Resampler(engine_rate, rate, channels, adaptive=drift_compensation)
+        self.drift = DriftEstimator(chunk / engine_rate) if drift_compensation else None
+        self.frames = int(chunk * rate / engine_rate)
+        self.target_fill = int(target_blocks * self.frames)
+        self.primed = False
+        self.pcm = PcmBuffer(self.resampler.max_output(chunk), channels)
+        self.silence = bytes(self.frames * channels * 2)
+        self.worker = OutputWorker(stream, self.silence, chunk / engine_rate, channels * 2,
+                                   depth=queue_depth, policy=queue_policy)
+
+    def latency(self):
+        """输出侧延迟估计（秒）：重采样群延迟 + 写入队列平均等待时间 + 设备缓冲"""
+        fill = self.worker.queued_frames()
+        if self.drift and self.drift.error is not None:
+            fill = self.target_fill - self.drift.error * self.rate
+        return self.resampler.delay() + max(0.0, fill - self.frames / 2) / self.rate + self.stream.latency()
+
+    def close(self):
+        self.worker.stop()
+        self.stream.close()
+
+
+class RoutingEngine:
+    """非阻塞音频路由引擎（不依赖界面，设备访问全部通过 AudioBackend）
+
+    每个输入通过后端的音频回调填充各自的环形缓冲区，混音线程按固定节拍
+    （chunk / sample_rate）取数据混音。某个输入卡住时，到点后直接用其余输入
+    混音，不会拖慢其它设备；每个输入最多积压两个 chunk，延迟保持有界。
+
+    drift_compensation=True 时每个输入/输出用 DriftEstimator 跟踪设备时钟相对
+    混音节拍的偏差，并微调各自的重采样比例，长时间运行也不会逐渐积压或缺帧。
+
+    sample_rate 是引擎内部采样率：每个输入先重采样到该采样率再混音，
+    每个输出再从该采样率重采样到设备采样率。
+
+    每个输出都有自己的写入线程和有界队列（见 OutputWorker），混音线程从不
+    阻塞在设备写入上。
+
+    路由由 routes（RoutingMatrix）决定，每个输入声道可以带增益送到任意输出声道。
+    当前生效的 Mixer 是一个不可变快照，同时持有它所对应的输入/输出流，混音线程
+    每个节拍只读取一次 self.mixer，不加锁。运行中的设备和增益变化由唯一的重配置
+    线程处理（request_update），新流在混音线程之外打开并预热，再以一个交叉淡化的
+    过渡配置在 chunk 边界切换，其它设备的音频不会中断。
+
+    设备支持的采样率来自 registry（DeviceRegistry），每个设备只探测一次；
+    不传时使用只缓存在内存中的注册表。
+
+    chunk、ring_chunks、input_headroom、output_target、output_queue_depth 决定延迟，
+    可以用 apply_profile() 一次设置为 LATENCY_PROFILES 中的某个档位。
+
+    taps 是录音分接点 (kind, idx, RecordingTap) 的元组，和 mixer 一样整体替换，
+    混音线程每个 chunk 把对应输入/输出的音频交给它们，不会因为磁盘而阻塞。
+
+    dsp 按输入设备索引保存处理链配置（见 dsp.DspChain），重新打开流后仍然生效；
+    set_input_chain() 在调用线程中建好新的处理链，交给 inp.next_chain，由混音线程交叉淡化后切换。
+    """
+
+    def __init__(self, backend, sample_rate=44100, chunk=1024, ring_chunks=4,
+                 output_queue_depth=4, output_queue_policy='drop_oldest', drift_compensation=True,
+                 registry=None, input_headroom=1.5, output_target=1.5):
+        self.backend = backend
+        self.registry = registry or DeviceRegistry(backend)
+        self.sample_rate = sample_rate
+        self.chunk = chunk
+        self.ring_chunks = ring_chunks
+        self.output_queue_depth = output_queue_depth
+        self.output_queue_policy = output_queue_policy
+        self.drift_compensation = drift_compensation
+        self.input_headroom = input_headroom
+        self.output_target = output_target
+        self.profile = None
+        self.selected = ([], [])
+        self.input_streams = []
+        self.output_streams = []
+        self.running = False
+        self.on_error = None
+        self.route_thread = None
+        self.routes = RoutingMatrix()
+        self.telemetry = EngineTelemetry()
+        self.mixer = None
+        self.taps = ()
+        self.dsp = {}
+        self._wake = threading.Event()
+        self._swapped = threading.Event()
+        self._pending = None
+        self._reconfig = threading.Condition()
+        self._reconfig_thread = None
+
+    def apply_profile(self, name):
+        """切换延迟档位；chunk 等参数只对之后打开的流生效
+
+        混音线程按 self.chunk 读写当前的流，运行中不能直接修改，要用 restart(name)。
+        """
+        if name not in LATENCY_PROFILES:
+            raise ValueError(f"未知的延迟档位: {name}")
+        if self.running:
+            raise RuntimeError("路由运行中不能直接切换延迟档位，请使用 restart(profile)")
+        profile = LATENCY_PROFILES[name]
+        self.chunk = profile['chunk']
+        self.ring_chunks = profile['ring_chunks']
+        self.input_headroom = profile['input_headroom']
+        self.output_target = profile['output_target']
+        self.output_queue_depth = profile['queue_depth']
+        self.profile = name
+
+    def restart(self, profile=None):
+        """用同样的设备选择重新打开所有流（可同时切换延迟档位）
+
+        正在进行的录音在新的流上继续，写入同一前缀的下一个文件；设备没能重新打开时
+        对应的录音结束。
+        """
+        selected_inputs, selected_outputs = self.selected
+        taps = self.taps
+        self.stop()
+        if profile:
+            self.apply_profile(profile)
+        self.start(selected_inputs, selected_outputs)
+        # stop() 已经等写入线程结束，这时的 part 才是最终的文件数
+        for kind, idx, tap in taps:
+            try:
+                self.start_recording(kind, idx, tap.prefix, part=tap.part, **tap.options)
+            except Exception as e:
+                print(f"重新开始录音失败 ({kind} {idx}): {e}")
+
+    def get_supported_rate(self, device_info, is_input=True):
+        """获取设备支持的采样率（来自注册表缓存）"""
+        return self.registry.supported_rate(device_info, is_input)
+
+    def open_input(self, idx, name, dev):
+        try:
+            rate, channels = self.get_supported_rate(dev, is_input=True)
+            inp = InputStream(idx, rate, channels, self.chunk, self.ring_chunks, self.sample_rate,
+                              self.drift_compensation, self.input_headroom)
+            inp.chain = inp.next_chain = self.build_chain(inp)
+            with self.registry.lock:
+                inp.stream = self.backend.open_input(idx, rate, channels, self.chunk, inp.callback)
+            return inp
+        except Exception as e:
+            # 缓存可能已过期（驱动更新、设备设置改变），下次重新探测
+            self.registry.invalidate(dev)
+            raise StreamOpenError(True, idx, name, e)
+
+    def build_chain(self, inp, specs=None):
+        specs = self.dsp.get(inp.idx, ()) if specs is None else specs
+        return DspChain(self.chunk, inp.channels, self.sample_rate, specs)
+
+    def set_input_chain(self, idx, specs):
+        """设置输入 idx 的处理链，例如 [{'type': 'highpass', 'cutoff': 80}, {'type': 'gate'}]
+
+        运行中同样生效：新处理链建好后赋给 inp.next_chain，混音线程在下一个 chunk 里
+        从旧链交叉淡化到新链（见 InputStream.process_chain），不加锁、不会爆音。
+        """
+        specs = [dict(spec) for spec in specs]
+        chains = [(inp, self.build_chain(inp, specs)) for inp in self.input_streams if inp.idx == idx]
+        if not chains:
+            # 没有打开的流时也先检查配置是否有效
+            DspChain(self.chunk, 1, self.sample_rate, specs)
+        self.dsp[idx] = specs
+        for inp, chain in chains:
+            inp.next_chain = chain
+
+    def open_output(self, idx, name, dev):
+        try:
+            rate, channels = self.get_supported_rate(dev, is_input=False)
+            with self.registry.lock:
+                stream = self.backend.open_output(idx, rate, channels, self.chunk)
+            return OutputStream(idx, rate, channels, stream, self.sample_rate, self.chunk,
+                                self.output_queue_depth, self.output_queue_policy, self.drift_compensation,
+                                self.output_target)
+        except Exception as e:
+            self.registry.invalidate(dev)
+            raise StreamOpenError(False, idx, name, e)
+
+    def open_streams(self, selected_inputs, selected_outputs):
+        """打开所有流并建立混音器，但不启动混音线程（测试和基准可直接调用 mix_once）
+
+        失败时清理并抛出 StreamOpenError。
+        """
+        inputs = []
+        outputs = []
+        try:
+            for idx, name, dev in selected_inputs:
+                inputs.append(self.open_input(idx, name, dev))
+            for idx, name, dev in selected_outputs:
+                outputs.append(self.open_output(idx, name, dev))
+        except Exception:
+            for item in inputs + outputs:
+                item.close()
+            raise
+        self.input_streams = inputs
+        self.output_streams = outputs
+        self.selected = (list(selected_inputs), list(selected_outputs))
+        self.mixer = self.build_mixer(inputs, outputs)
+        self.telemetry.reset()
+
+    def start(self, selected_inputs, selected_outputs):
+        """打开所有流并启动混音线程和重配置线程；失败时清理并抛出 StreamOpenError"""
+        self.open_streams(selected_inputs, selected_outputs)
+        self.running = True
+        self._wake.clear()
+        self._pending = None
+        self.route_thread = threading.Thread(target=self.route_audio, daemon=True)
+        self.route_thread.start()
+        self._reconfig_thread = threading.Thread(target=self.reconfigure_loop, daemon=True)
+        self._reconfig_thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        with self._reconfig:
+            self._reconfig.notify_all()
+        if self._reconfig_thread:
+            self._reconfig_thread.join(timeout=2)
+            self._reconfig_thread = None
+        if self.route_thread:
+            self.route_thread.join(timeout=1)
+            self.route_thread = None
+        self.stop_recording()
+        self.cleanup_streams()
+
+    def cleanup_streams(self):
+        """清理所有流"""
+        mixer = self.mixer
+        self.mixer = None
+        streams = self.input_streams + self.output_streams
+        if mixer:
+            streams += [item for item in mixer.inputs + mixer.outputs if item not in streams]
+        for item in streams:
+            item.close()
+        self.input_streams = []
+        self.output_streams = []
+
+    def build_mixer(self, inputs, outputs):
+        """按给定的流列表和当前路由表创建稳定配置"""
+        return Mixer(self.chunk, inputs, outputs, self.routes.build(inputs, outputs))
+
+    def set_route_gain(self, in_idx, out_idx, gain):
+        """设置某个输入设备到某个输出设备的增益（0 表示不路由）
+
+        运行中由重配置线程在下一个 chunk 边界淡入新增益。
+        """
+        self.routes.set_gain(in_idx, out_idx, gain)
+        if self.running:
+            self.request_update()
+        elif self.mixer:
+            self.mixer = self.build_mixer(self.input_streams, self.output_streams)
+
+    def start_recording(self, kind, idx, prefix, **options):
+        """录制某个输入（kind='input'，重采样到引擎采样率之后）或某个输出的混音总线
+        （kind='output'，重采样到设备采样率之前），返回 RecordingTap
+
+        options 传给 RecordingTap（format、rotate_bytes、rotate_seconds 等）。
+        """
+        streams = self.input_streams if kind == 'input' else self.output_streams
+        matches = [item for item in streams if item.idx == idx]
+        if not matches:
+            raise ValueError(f"没有打开的{'输入' if kind == 'input' else '输出'}设备: {idx}")
+        tap = RecordingTap(prefix, self.sample_rate, matches[0].channels, self.chunk, **options)
+        self.taps = self.taps + ((kind, idx, tap),)
+        return tap
+
+    def stop_recording(self, tap=None):
+        """停止指定的录音（None 表示全部），等剩余数据写完后关闭文件"""
+        stopped = [item for item in self.taps if tap is None or item[2] is tap]
+        self.taps = tuple(item for item in self.taps if item not in stopped)
+        for _, _, item in stopped:
+            item.close()
+
+    def request_update(self, selected_inputs=None, selected_outputs=None):
+        """非阻塞地请求重配置；selected_* 为 None 表示保持当前设备，只重新应用路由增益
+
+        请求交给唯一的重配置线程，连续多次请求只应用最新的设备选择。
+        """
+        with self._reconfig:
+            pending = self._pending or (None, None)
+            if selected_inputs is not None:
+                pending = (list(selected_inputs), list(selected_outputs))
+            self._pending = pending
+            self._reconfig.notify_all()
+
+    def reconfigure_loop(self):
+        """重配置线程：依次应用 request_update() 提交的请求"""
+        while self.running:
+            with self._reconfig:
+                self._reconfig.wait_for(lambda: self._pending is not None or not self.running)
+                if not self.running:
+                    break
+                selected_inputs, selected_outputs = self._pending
+                self._pending = None
+            try:
+                self.update_streams(selected_inputs, selected_outputs)
+            except Exception as e:
+                print(f"重配置错误: {e}")
+
+    def update_streams(self, selected_inputs=None, selected_outputs=None):
+        """动态更新音频流：只关闭取消勾选的设备，只打开新勾选的设备
+
+        新流在调用线程中打开并预热，然后通过 swap_mixer() 在 chunk 边界切换，
+        过渡完成后才关闭被移除的流。被移除设备上的录音随之结束（文件正常收尾），
+        重新勾选设备后需要重新开始录音。selected_* 为 None 时只重新应用路由增益。
+        """
+        inputs, removed_inputs, new_inputs = self._diff_streams(self.input_streams, selected_inputs, True)
+        outputs, removed_outputs, new_outputs = self._diff_streams(self.output_streams, selected_outputs, False)
+        self.warm_up(new_inputs, new_outputs)
+        if not self.running and threading.current_thread() is self._reconfig_thread:
+            # 预热期间引擎已停止：新流不再交给混音线程
+            for item in new_inputs + new_outputs:
+                item.close()
+            return
+        self.swap_mixer(self.build_mixer(inputs, outputs), removed_inputs, removed_outputs)
+        self.input_streams = inputs
+        self.output_streams = outputs
+        if selected_inputs is not None:
+            self.selected = (list(selected_inputs), list(selected_outputs))
+        removed = {('input', item.idx) for item in removed_inputs} | {('output', item.idx) for item in removed_outputs}
+        for kind, idx, tap in self.taps:
+            if (kind, idx) in removed:
+                self.stop_recording(tap)
+        for item in removed_inputs + removed_outputs:
+            item.close()
+
+    def _diff_streams(self, current, selected, is_input):
+        """返回 (新的流列表, 要移除的流, 新打开的流)；打不开的设备跳过"""
+        if selected is None:
+            return list(current), [], []
+        ids = {idx for idx, _, _ in selected}
+        kept = [item for item in current if item.idx in ids]
+        kept_ids = {item.idx for item in kept}
+        opened = []
+        for idx, name, dev in selected:
+            if idx in kept_ids:
+                continue
+            try:
+                opened.append(self.open_input(idx, name, dev) if is_input else self.open_output(idx, name, dev))
+                kept_ids.add(idx)
+            except StreamOpenError as e:
+                print(f"打开{'输入' if is_input else '输出'}流错误: {e}")
+        return kept + opened, [item for item in current if item.idx not in ids], opened
+
+    def warm_up(self, inputs, outputs, timeout=1.0):
+        """在混音线程之外预热新流：等输入缓冲区预填到目标，给输出设备缓冲区填满静音"""
+        deadline = time.perf_counter() + timeout
+        for out in outputs:
+            while out.worker.queued_frames() < out.target_fill - out.frames and time.perf_counter() < deadline:
+                out.worker.put(out.silence)
+                time.sleep(out.frames / out.rate / 4)
+            out.primed = True
+        for inp in inputs:
+            while inp.ring.available() < inp.target_fill and time.perf_counter() < deadline:
+                time.sleep(self.chunk / self.sample_rate / 4)
+
+    def swap_mixer(self, settled, removed_inputs=(), removed_outputs=()):
+        """在 chunk 边界切换到 settled，同时用一个 chunk 交叉淡化
+
+        过渡配置额外包含被移除的流（新增益为 0），让它们淡出而不是突然消失。
+        混音线程处理完过渡配置后自己把 self.mixer 换成 settled；这期间只有
+        混音线程写 self.mixer，因此不需要锁。
+        """
+        current = self.mixer
+        if current is None or not self.running:
+            self.mixer = settled
+            return
+        inputs = settled.inputs + tuple(removed_inputs)
+        outputs = settled.outputs + tuple(removed_outputs)
+        gains = self.routes.build(inputs, outputs)
+        gains[settled.in_channels:, :] = 0
+        gains[:, settled.out_channels:] = 0
+        transition = Mixer(self.chunk, inputs, outputs, gains,
+                           fade_from=remap_gains(current, inputs, outputs), settled=settled)
+        self._swapped.clear()
+        self.mixer = transition
+        if not self._swapped.wait(timeout=max(1.0, 8 * self.chunk / self.sample_rate)):
+            # 混音线程已经停止或卡住，直接切换
+            self.mixer = settled
+
+    def snapshot(self):
+        """引擎运行状态快照（可直接序列化为 JSON）"""
+        stats = self.telemetry.to_dict()
+        stats['time'] = time.time()
+        stats['budget_ms'] = self.chunk / self.sample_rate * 1000
+        stats['profile'] = self.profile
+        stats['chunk'] = self.chunk
+        stats['inputs'] = [{
+            'idx': inp.idx,
+            'rate': inp.rate,
+            'channels': inp.channels,
+            'fill': inp.ring.available() / inp.ring.capacity,
+            'latency_ms': inp.ring.available() / inp.rate * 1000,
+            'drift_ppm': inp.drift.drift_ppm if inp.drift else None,
+            'overflows': inp.overflows + inp.ring.overflows,
+            'misses': inp.misses,
+            'drops': inp.drops,
+            'dsp': inp.next_chain.specs if inp.next_chain else [],
+            'peak_db': inp.chain.meter.peak_db if inp.chain else None,
+            'rms_db': inp.chain.meter.rms_db if inp.chain else None,
+            'dsp_time': inp.chain.cost.to_dict() if inp.chain else None,
+        } for inp in self.input_streams]
+        stats['outputs'] = [{
+            'idx': out.idx,
+            'rate': out.rate,
+            'channels': out.channels,
+            'queue': out.worker.queue_depth(),
+            'queue_capacity': out.worker.depth,
+            'latency_ms': out.worker.queued_frames() / out.rate * 1000,
+            'drift_ppm': out.drift.drift_ppm if out.drift else None,
+            'dropped': out.worker.dropped,
+            'underruns': out.worker.underruns,
+            'underflows': out.worker.underflows,
+            'write': out.worker.write_time.to_dict(),
+        } for out in self.output_streams]
+        stats['routes'] = self.route_latencies()
+        stats['recordings'] = [dict(tap.stats(), kind=kind, idx=idx) for kind, idx, tap in self.taps]
+        return stats
+
+    def route_latencies(self):
+        """每条生效路由（增益不为 0）的输入到输出延迟估计，单位 ms
+
+        由各环节相加：输入设备缓冲、输入环形缓冲区、重采样、输出队列、输出设备缓冲。
+        """
+        mixer = self.mixer
+        if mixer is None:
+            return []
+        mixer = mixer.settled or mixer
+        routes = []
+        for inp, rows in zip(mixer.inputs, mixer.input_slices):
+            for out, cols in zip(mixer.outputs, mixer.output_slices):
+                if mixer.gains[rows, cols].any():
+                    routes.append({'input': inp.idx, 'output': out.idx,
+                                   'latency_ms': (inp.latency() + out.latency()) * 1000})
+        return routes
+
+    def route_audio(self):
+        """混音线程：按固定节拍（chunk / sample_rate）混音一次"""
+        period = self.chunk / self.sample_rate
+        next_tick = time.perf_counter() + period
+        try:
+            while self.running:
+                remaining = next_tick - time.perf_counter()
+                if remaining > 0:
+                    self._wake.wait(remaining)
+                elif remaining < -4 * period:
+                    # 严重落后（例如系统休眠后）时重新对齐节拍，不去追赶
+                    next_tick = time.perf_counter()
+                if not self.running:
+                    break
+                next_tick += period
+                self.mix_once()
+        except Exception as e:
+            print(f"路由线程错误: {e}")
+            self.running = False
+            if self.on_error:
+                self.on_error(e)
+
+    def mix_once(self):
+        """从各输入的环形缓冲区取一个 chunk，经路由矩阵混音后交给各输出"""
+        mixer = self.mixer
+        if mixer is None:
+            return
+        t0 = time.perf_counter()
+        mixer.begin()
+        mixed_any = False
+        dsp_time = 0.0
+        for k, inp in enumerate(mixer.inputs):
+            available = inp.ring.available()
+            if not inp.primed:
+                if available < inp.target_fill:
+                    continue
+                inp.primed = True
+            if available > inp.max_fill:
+                # 积压过多（设备卡顿后突发），直接丢弃最旧的数据回到目标延迟
+                inp.ring.skip(available - inp.target_fill)
+                inp.drops += 1
+                available = inp.target_fill
+            if inp.drift:
+                correction = inp.drift.update((available - inp.target_fill) / inp.rate)
+                inp.resampler.ratio = 1 + correction
+            needed = inp.resampler.frames_needed(self.chunk)
+            if available < needed:
+                # 该输入本节拍数据不足，跳过而不是等待，并重新预填
+                inp.misses += 1
+                inp.primed = False
+                continue
+            frames = inp.buffer[:needed]
+            inp.ring.read_into(frames)
+            if inp.resampler.passthrough:
+                int16_to_float(frames, mixer.input_view(k))
+            else:
+                mixer.load_input(k, inp.resampler.process(int16_to_float(frames, inp.work), self.chunk))
+            dsp_time += inp.process_chain(mixer.input_view(k))
+            mixed_any = True
+
+        if not mixed_any:
+            # 仍然输出静音，保持各输出设备的节拍连续
+            self.telemetry.idle_cycles += 1
+        t_read = time.perf_counter()
+        mixer.mix()
+        t_mix = time.perf_counter()
+
+        for kind, idx, tap in self.taps:
+            if kind == 'input':
+                k = mixer.input_index.get(idx)
+                if k is not None:
+                    tap.push(mixer.input_view(k))
+            else:
+                j = mixer.output_index.get(idx)
+                if j is not None:
+                    tap.push(mixer.output_view(j))
+
+        for j, out in enumerate(mixer.outputs):
+            payload = out.pcm.render(out.resampler.process(mixer.output_view(j)))
+            if not out.primed:
+                # 启动时每个节拍多写一块静音，先填满设备缓冲区，直到队列开始积压
+                if out.worker.queued_frames() < out.target_fill - out.frames:
+                    out.worker.put(out.silence)
+                else:
+                    out.primed = True
+            # PcmBuffer 下个节拍会被复用，队列中需要一份独立的数据
+            out.worker.put(payload.tobytes())
+            if out.primed and out.drift:
+                correction = out.drift.update((out.target_fill - out.worker.queued_frames()) / out.rate)
+                out.resampler.ratio = 1 / (1 + correction)
+        if mixer.settled is not None:
+            # 交叉淡化的一个 chunk 已经完成，切换到稳定配置
+            self.mixer = mixer.settled
+            self._swapped.set()
+        self.telemetry.record_cycle(t0, t_read, t_mix, time.perf_counter(), dsp_time)
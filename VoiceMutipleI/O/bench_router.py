@@ -0,0 +1,241 @@
+"""路由/混音路径基准测试（不需要声卡）
+
+用 FakeBackend 的模拟时钟驱动虚拟输入输出，逐个 chunk 调用 engine.mix_once()，
+测量每个场景的吞吐（引擎帧/秒、实时倍数）、每 chunk 耗时 p50/p99，以及每 chunk
+的内存分配。结果保存为 JSON，可与之前的结果对比以发现性能回退::
+
+    python bench_router.py                         # 以基准场景为中心逐维度扫描
+    python bench_router.py --full                  # 全组合
+    python bench_router.py -o new.json --compare old.json
+    python bench_router.py --drift                 # 时钟漂移补偿仿真（+200 ppm 设备）
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from audio_backends import FakeBackend, FakeDevice
+from audio_engine import RoutingEngine
+
+ENGINE_RATE = 48000
+BASELINE = {'inputs': 4, 'outputs': 2, 'channels': 2, 'mismatched': False, 'chunk': 1024}
+SWEEPS = {
+    'inputs': [1, 2, 4, 8, 16, 32],
+    'outputs': [1, 2, 4, 8, 16],
+    'channels': [1, 2],
+    'mismatched': [False, True],
+    'chunk': [64, 256, 1024, 4096],
+}
+
+
+def scenarios(full=False):
+    """默认以 BASELINE 为中心一次只改变一个维度；full=True 时返回全组合"""
+    if full:
+        keys = list(SWEEPS)
+        for values in itertools.product(*(SWEEPS[key] for key in keys)):
+            yield dict(zip(keys, values))
+        return
+    seen = set()
+    for key, values in SWEEPS.items():
+        for value in values:
+            scenario = dict(BASELINE, **{key: value})
+            ident = tuple(sorted(scenario.items()))
+            if ident not in seen:
+                seen.add(ident)
+                yield scenario
+
+
+def scenario_name(scenario):
+    return (f"in{scenario['inputs']}_out{scenario['outputs']}_ch{scenario['channels']}"
+            f"_{'mixed' if scenario['mismatched'] else 'same'}_c{scenario['chunk']}")
+
+
+def build_engine(scenario):
+    """按场景创建虚拟设备和引擎；设备采样率不一致时一半设备用 44.1 kHz"""
+    def rate(i):
+        return 44100 if scenario['mismatched'] and i % 2 else ENGINE_RATE
+
+    n_in, n_out, channels = scenario['inputs'], scenario['outputs'], scenario['channels']
+    devices = [FakeDevice(f"in{i}", max_input_channels=channels, rate=rate(i), frequency=220.0 + 55 * i)
+               for i in range(n_in)]
+    devices += [FakeDevice(f"out{i}", max_output_channels=channels, rate=rate(i)) for i in range(n_out)]
+    backend = FakeBackend(devices, realtime=False)
+    engine = RoutingEngine(backend, sample_rate=ENGINE_RATE, chunk=scenario['chunk'])
+    selected = [(dev['index'], dev['name'], dev) for dev in backend.list_devices()]
+    engine.open_streams(selected[:n_in], selected[n_in:])
+    return backend, engine
+
+
+def run_scenario(scenario, min_seconds=0.5, min_cycles=50, max_cycles=5000):
+    backend, engine = build_engine(scenario)
+    period = scenario['chunk'] / ENGINE_RATE
+    try:
+        def cycle():
+            backend.clock.advance(period)
+            t0 = time.perf_counter()
+            engine.mix_once()
+            return time.perf_counter() - t0
+
+        for _ in range(20):
+            cycle()
+        warm = np.mean([cycle() for _ in range(20)])
+        n = int(min(max_cycles, max(min_cycles, min_seconds / max(warm, 1e-6))))
+        times = np.array([cycle() for _ in range(n)])
+
+        # 分配统计单独进行，避免 tracemalloc 影响计时
+        tracemalloc.start()
+        blocks_before = len(tracemalloc.take_snapshot().traces)
+        peaks = []
+        for _ in range(min(n, 50)):
+            backend.clock.advance(period)
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            engine.mix_once()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        blocks_after = len(tracemalloc.take_snapshot().traces)
+        tracemalloc.stop()
+
+        total = times.sum()
+        frames_per_second = n * scenario['chunk'] / total
+        return dict(scenario,
+                    name=scenario_name(scenario),
+                    cycles=int(n),
+                    frames_per_second=frames_per_second,
+                    realtime_factor=frames_per_second / ENGINE_RATE,
+                    p50_ms=float(np.percentile(times, 50) * 1000),
+                    p99_ms=float(np.percentile(times, 99) * 1000),
+                    max_ms=float(times.max() * 1000),
+                    budget_ms=period * 1000,
+                    alloc_peak_bytes_per_chunk=float(np.median(peaks)),
+                    alloc_net_blocks_per_chunk=(blocks_after - blocks_before) / len(peaks))
+    finally:
+        engine.cleanup_streams()
+        backend.terminate()
+
+
+DRIFT_DEVICES = [
+    FakeDevice("in_ref", max_input_channels=2, rate=48000, ppm=0.0, frequency=440.0),
+    FakeDevice("in_fast", max_input_channels=2, rate=44100, ppm=200.0, frequency=660.0),
+    FakeDevice("out_ref", max_output_channels=2, rate=48000, ppm=0.0),
+    FakeDevice("out_slow", max_output_channels=2, rate=48000, ppm=-120.0),
+]
+
+
+def run_drift(seconds=180.0, chunk=1024, settle=60.0):
+    """仿真 seconds 秒：各设备按自身 ppm 运行，报告估计漂移与真实值，以及稳定后的延迟波动"""
+    backend = FakeBackend(DRIFT_DEVICES, realtime=False)
+    engine = RoutingEngine(backend, sample_rate=ENGINE_RATE, chunk=chunk)
+    selected = [(dev['index'], dev['name'], dev) for dev in backend.list_devices()]
+    engine.open_streams(selected[:2], selected[2:])
+    period = chunk / ENGINE_RATE
+    streams = engine.input_streams + engine.output_streams
+    latency = {id(s): [] for s in streams}
+    try:
+        for cycle in range(int(seconds / period)):
+            backend.clock.advance(period)
+            # 让输出写入线程有机会把已腾出的设备缓冲区填上
+            time.sleep(0.001)
+            engine.mix_once()
+            if cycle * period >= settle:
+                snapshot = engine.snapshot()
+                for s, stats in zip(streams, snapshot['inputs'] + snapshot['outputs']):
+                    latency[id(s)].append(stats['latency_ms'])
+        snapshot = engine.snapshot()
+        results = []
+        for s, stats in zip(streams, snapshot['inputs'] + snapshot['outputs']):
+            device = DRIFT_DEVICES[s.idx]
+            values = latency[id(s)]
+            results.append({
+                'device': device.name,
+                'true_ppm': device.ppm,
+                'estimated_ppm': stats['drift_ppm'],
+                'latency_ms_mean': float(np.mean(values)),
+                'latency_ms_min': float(np.min(values)),
+                'latency_ms_max': float(np.max(values)),
+                'misses': stats.get('misses', 0),
+                'drops': stats.get('drops', stats.get('dropped', 0)),
+            })
+        return results
+    finally:
+        engine.cleanup_streams()
+        backend.terminate()
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def compare(results, baseline_path, threshold=0.10):
+    """与之前的结果逐场景对比 p99 和吞吐，返回回退的场景数"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\n对比 {baseline_path}（阈值 {threshold:.0%}）")
+    for r in results:
+        old = baseline.get(r['name'])
+        if not old:
+            continue
+        p99 = r['p99_ms'] / old['p99_ms'] - 1
+        fps = r['frames_per_second'] / old['frames_per_second'] - 1
+        flag = ""
+        if p99 > threshold or fps < -threshold:
+            flag = "  ⚠ 回退"
+            regressions += 1
+        print(f"{r['name']:34} p99 {p99:+7.1%}  吞吐 {fps:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="路由/混音路径基准测试")
+    parser.add_argument("--full", action="store_true", help="运行全部参数组合")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--seconds", type=float, default=0.5, help="每个场景的最短计时时长")
+    parser.add_argument("--drift", action="store_true", help="运行时钟漂移补偿仿真")
+    args = parser.parse_args(argv)
+
+    if args.drift:
+        print(f"{'设备':10} {'真实 ppm':>9} {'估计 ppm':>9} {'延迟 ms 均值':>12} {'最小':>7} {'最大':>7} "
+              f"{'缺帧':>5} {'丢弃':>5}")
+        for r in run_drift():
+            print(f"{r['device']:10} {r['true_ppm']:9.1f} {r['estimated_ppm']:9.1f} {r['latency_ms_mean']:12.2f} "
+                  f"{r['latency_ms_min']:7.2f} {r['latency_ms_max']:7.2f} {r['misses']:5} {r['drops']:5}")
+        return 0
+
+    results = []
+    print(f"{'场景':34} {'实时倍数':>8} {'p50 ms':>8} {'p99 ms':>8} {'预算 ms':>8} {'分配 B/chunk':>12}")
+    for scenario in scenarios(args.full):
+        r = run_scenario(scenario, min_seconds=args.seconds)
+        results.append(r)
+        print(f"{r['name']:34} {r['realtime_factor']:8.1f} {r['p50_ms']:8.3f} {r['p99_ms']:8.3f} "
+              f"{r['budget_ms']:8.2f} {r['alloc_peak_bytes_per_chunk']:12.0f}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"\n结果已保存到 {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+
+PROBE_RATES = [44100, 48000, 32000, 22050, 16000, 8000]
+CACHE_VERSION = 1
+LATENCY_KEYS = ('defaultLowInputLatency', 'defaultHighInputLatency',
+                'defaultLowOutputLatency', 'defaultHighOutputLatency')
+
+
+def device_key(dev):
+    """设备的稳定标识：主机 API + 设备名（热插拔后索引会变化，名称不会）"""
+    return f"{dev.get('hostApiName', dev.get('hostApi', ''))}/{dev['name']}"
+
+
+def keyed_devices(devices):
+    """{device_key: dev}；同名设备（例如两个相同型号的 USB 麦克风）按枚举顺序加 #2、#3"""
+    keyed = {}
+    for dev in devices:
+        key = base = device_key(dev)
+        n = 1
+        while key in keyed:
+            n += 1
+            key = f"{base}#{n}"
+        keyed[key] = dev
+    return keyed
+
+
+def fingerprint(dev):
+    """list_devices() 已经返回的信息；不变就认为缓存的探测结果仍然有效"""
+    return [dev['maxInputChannels'], dev['maxOutputChannels'], float(dev['defaultSampleRate'])] + \
+        [dev.get(key) for key in LATENCY_KEYS]
+
+
+class DeviceRegistry:
+    """设备能力注册表：每个设备只探测一次，结果按 device_key 缓存到磁盘
+
+    探测会对每个方向调用多次 is_format_supported，在设备很多的机器上很慢；
+    之后的启动只要 fingerprint 不变就直接使用缓存。rescan() 重新枚举设备，
+    只探测新增或变化的设备，并返回 (added, removed, changed)，界面据此增量更新。
+    cache_path 为 None 时只缓存在内存中。
+
+    lock 串行化所有后端访问：重新初始化 PortAudio 时不能同时打开流，
+    RoutingEngine 打开流时也持有这把锁。
+    """
+
+    def __init__(self, backend, cache_path=None, rates=PROBE_RATES):
+        self.backend = backend
+        self.cache_path = cache_path
+        self.rates = list(rates)
+        self._cache = self.load_cache()
+        self._dirty = False
+        self.lock = threading.RLock()
+        self.devices = keyed_devices(backend.list_devices())
+
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取设备缓存失败: {e}")
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('devices', {})
+
+    def save_cache(self):
+        """把有变化的探测结果写回磁盘（先写临时文件再替换，避免写一半的缓存）"""
+        if not self.cache_path or not self._dirty:
+            return
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'devices': self._cache}, f, indent=1, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"保存设备缓存失败: {e}")
+
+    def list_devices(self):
+        """当前设备列表（按索引排序）"""
+        return sorted(self.devices.values(), key=lambda dev: dev['index'])
+
+    def key_of(self, dev):
+        for key, known in self.devices.items():
+            if known['index'] == dev['index']:
+                return key
+        return device_key(dev)
+
+    def probe(self, dev):
+        """探测设备两个方向支持的采样率（只探测 int16，引擎只使用这一种格式）"""
+        caps = {'fingerprint': fingerprint(dev), 'formats': ['int16'],
+                'latency': {key: dev.get(key) for key in LATENCY_KEYS}}
+        for direction, is_input, max_key in (('input', True, 'maxInputChannels'),
+                                             ('output', False, 'maxOutputChannels')):
+            channels = min(2, dev[max_key])
+            if channels <= 0:
+                continue
+            rates = [rate for rate in self.rates
+                     if self.backend.is_format_supported(dev['index'], rate, channels, is_input)]
+            caps[direction] = {'channels': channels, 'max_channels': dev[max_key], 'rates': rates}
+        return caps
+
+    def capabilities(self, dev):
+        """缓存命中直接返回；没有缓存或设备信息变化时重新探测"""
+        with self.lock:
+            key = self.key_of(dev)
+            caps = self._cache.get(key)
+            if caps is None or caps['fingerprint'] != fingerprint(dev):
+                caps = self._cache[key] = self.probe(dev)
+                self._dirty = True
+            return caps
+
+    def invalidate(self, dev):
+        """打开设备失败时丢弃缓存，下次重新探测"""
+        with self.lock:
+            if self._cache.pop(self.key_of(dev), None) is not None:
+                self._dirty = True
+
+    def supported_rate(self, dev, is_input=True):
+        """返回 (rate, channels)：优先使用 rates 中第一个支持的采样率"""
+        caps = self.capabilities(dev).get('input' if is_input else 'output')
+        if caps and caps['rates']:
+            return caps['rates'][0], caps['channels']
+        return int(dev.get('defaultSampleRate', 44100)), 1
+
+    def warm(self):
+        """探测所有还没有缓存的设备（界面启动后在后台线程调用，开始路由时就不用再等）"""
+        for dev in self.list_devices():
+            self.capabilities(dev)
+        with self.lock:
+            self.save_cache()
+
+    def rescan(self):
+        """重新枚举设备，返回 (added, removed, changed) 三个 device_key 列表
+
+        changed 包括索引变化（热插拔后其它设备的索引可能移动）和能力变化。
+        新增和变化的设备会立即探测，调用方拿到结果时缓存已经是新的。
+        """
+        with self.lock:
+            if not self.backend.refresh():
+                return [], [], []
+            current = keyed_devices(self.backend.list_devices())
+            added = [key for key in current if key not in self.devices]
+            removed = [key for key in self.devices if key not in current]
+            changed = [key for key, dev in current.items()
+                       if key in self.devices and (dev['index'] != self.devices[key]['index']
+                                                   or fingerprint(dev) != fingerprint(self.devices[key]))]
+            self.devices = current
+            for key in added + changed:
+                self.capabilities(current[key])
+            self.save_cache()
+            return added, removed, changed
@@ -0,0 +1,47 @@
+import math
+
+
+class DriftEstimator:
+    """根据缓冲区填充量估计设备时钟相对引擎时钟的偏差（PI 控制器）
+
+    每个混音周期调用一次 update()，传入填充量相对目标的偏差（秒；设备比引擎快时为正），
+    返回重采样比例修正量 correction：输入流用 ratio = 1 + correction，
+    输出流用 ratio = 1 / (1 + correction)。填充量有界，所以 correction 的长期平均就是
+    设备的实际漂移，由 drift_ppm 报告（window 秒的一阶平均）。偏差先经过时间常数为
+    smoothing 秒的一阶平滑，滤掉设备块大小造成的锯齿；bandwidth（Hz）决定收敛速度。
+    开始的 settle 秒只用比例项把填充量拉回目标，不积分也不计入平均，避免启动时的
+    填充偏差被当成漂移。
+    """
+
+    def __init__(self, period, smoothing=2.0, bandwidth=0.02, max_ppm=2000, window=30.0, settle=5.0):
+        omega = 2 * math.pi * bandwidth
+        self.period = period
+        self.kp = 2 * omega
+        self.ki = omega * omega
+        self.alpha = period / (smoothing + period)
+        self.beta = period / (window + period)
+        self.limit = max_ppm * 1e-6
+        self.settle_cycles = int(settle / period)
+        self.cycles = 0
+        self.error = None
+        self.integral = 0.0
+        self.correction = 0.0
+        self.average = 0.0
+
+    def update(self, error_seconds):
+        if self.error is None:
+            self.error = error_seconds
+        else:
+            self.error += self.alpha * (error_seconds - self.error)
+        self.cycles += 1
+        settled = self.cycles > self.settle_cycles
+        if settled:
+            self.integral = min(self.limit, max(-self.limit, self.integral + self.ki * self.error * self.period))
+        self.correction = min(self.limit, max(-self.limit, self.integral + self.kp * self.error))
+        if settled:
+            self.average += self.beta * (self.correction - self.average)
+        return self.correction
+
+    @property
+    def drift_ppm(self):
+        return self.average * 1e6
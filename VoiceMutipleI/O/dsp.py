@@ -0,0 +1,216 @@
+import math
+import time
+
+import numpy as np
+
+from telemetry import LatencyHistogram
+
+
+def db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+
+def gain_to_db(gain):
+    return 20.0 * math.log10(gain) if gain > 1e-10 else -200.0
+
+
+class Gain:
+    """固定增益（dB）"""
+
+    def __init__(self, chunk, channels, rate, db=0.0):
+        self.gain = db_to_gain(db)
+
+    def process(self, x):
+        if self.gain != 1.0:
+            x *= self.gain
+
+
+class NoiseGate:
+    """噪声门：按 chunk 的 RMS 判断开关，增益按 attack / release 时间常数平滑并在 chunk 内线性过渡
+
+    电平低于 threshold_db 超过 hold_ms 后衰减到 floor_db；重新高于阈值时打开。
+    """
+
+    def __init__(self, chunk, channels, rate, threshold_db=-50.0, floor_db=-80.0, attack_ms=2.0,
+                 release_ms=150.0, hold_ms=100.0):
+        period = chunk / rate
+        self.threshold = db_to_gain(threshold_db) ** 2
+        self.floor = db_to_gain(floor_db)
+        self.attack = math.exp(-period / (attack_ms / 1000)) if attack_ms > 0 else 0.0
+        self.release = math.exp(-period / (release_ms / 1000)) if release_ms > 0 else 0.0
+        self.hold_chunks = int(math.ceil(hold_ms / 1000 / period))
+        self.gain = 1.0
+        self.open = True
+        self._held = 0
+        self._ramp = np.zeros((chunk, 1), dtype=np.float32)
+        self._t = (np.arange(1, chunk + 1, dtype=np.float32) / chunk)[:, None]
+
+    def process(self, x):
+        power = float(np.einsum('ij,ij->', x, x)) / x.size
+        if power >= self.threshold:
+            self.open = True
+            self._held = 0
+        else:
+            self._held += 1
+            if self._held > self.hold_chunks:
+                self.open = False
+        target, coeff = (1.0, self.attack) if self.open else (self.floor, self.release)
+        new = target + (self.gain - target) * coeff
+        if new == 1.0 and self.gain == 1.0:
+            return
+        ramp = self._ramp[:len(x)]
+        np.multiply(self._t[:len(x)], new - self.gain, out=ramp)
+        ramp += self.gain
+        x *= ramp
+        self.gain = new
+
+
+def highpass_coefficients(rate, cutoff, q=0.7071):
+    """RBJ Audio EQ Cookbook 二阶高通，返回归一化的 (b0, b1, b2), (a1, a2)"""
+    w0 = 2 * math.pi * cutoff / rate
+    alpha = math.sin(w0) / (2 * q)
+    cos = math.cos(w0)
+    a0 = 1 + alpha
+    b = ((1 + cos) / 2 / a0, -(1 + cos) / a0, (1 + cos) / 2 / a0)
+    a = (-2 * cos / a0, (1 - alpha) / a0)
+    return b, a
+
+
+class Biquad:
+    """分块矩阵形式的二阶 IIR 滤波器，状态跨 chunk 保持
+
+    逐样本递推在 Python 中太慢。这里把滤波器写成状态空间形式
+    s[n+1] = A s[n] + B x[n]，y[n] = C s[n] + D x[n]，把 chunk 切成长度 L 的子块：
+    子块内 y = T x + O s（T 为冲激响应构成的下三角 Toeplitz 矩阵），
+    子块之间的状态 s_k 由 A 的幂和 G x 一次性算出。整个 chunk 只需几次矩阵乘法，
+    所有矩阵在创建时预计算，缓冲区预分配。
+    """
+
+    def __init__(self, chunk, channels, b, a, block=64):
+        block = math.gcd(chunk, block)
+        blocks = chunk // block
+        b0, b1, b2 = b
+        a1, a2 = a
+        A = np.array([[-a1, 1.0], [-a2, 0.0]])
+        B = np.array([b1 - a1 * b0, b2 - a2 * b0])
+        C = np.array([1.0, 0.0])
+        powers = [np.eye(2)]
+        for _ in range(block):
+            powers.append(A @ powers[-1])
+        h = np.array([b0] + [C @ powers[i] @ B for i in range(block - 1)])
+        T = np.zeros((block, block))
+        for i in range(block):
+            T[i, :i + 1] = h[i::-1]
+        O = np.array([C @ powers[i] for i in range(block)])
+        G = np.stack([powers[block - 1 - j] @ B for j in range(block)], axis=1)
+        AL = powers[block]
+        block_powers = [np.eye(2)]
+        for _ in range(blocks):
+            block_powers.append(AL @ block_powers[-1])
+        # W[k, j] = A^(L*(k-1-j))，j < k；第 blocks 行给出下一个 chunk 的初始状态
+        W = np.zeros((blocks + 1, blocks, 2, 2))
+        for k in range(blocks + 1):
+            for j in range(k):
+                W[k, j] = block_powers[k - 1 - j]
+        self.block = block
+        self.blocks = blocks
+        self.T = T.astype(np.float32)
+        self.O = O.astype(np.float32)
+        self.G = G.astype(np.float32)
+        self.P = np.array(block_powers, dtype=np.float32)
+        self.W = W.astype(np.float32)
+        self.state = np.zeros((2, channels), dtype=np.float32)
+        self._gx = np.zeros((blocks, 2, channels), dtype=np.float32)
+        self._states = np.zeros((blocks + 1, 2, channels), dtype=np.float32)
+        self._init = np.zeros((blocks + 1, 2, channels), dtype=np.float32)
+        self._y = np.zeros((blocks, block, channels), dtype=np.float32)
+        self._yo = np.zeros((blocks, block, channels), dtype=np.float32)
+
+    def process(self, x):
+        """x: (chunk, channels)，原地滤波（可以是 Mixer 输入矩阵中的列视图）"""
+        X = x.reshape(self.blocks, self.block, -1)
+        np.matmul(self.G, X, out=self._gx)
+        np.einsum('kjab,jbc->kac', self.W, self._gx, out=self._states)
+        np.matmul(self.P, self.state, out=self._init)
+        self._states += self._init
+        np.matmul(self.T, X, out=self._y)
+        np.matmul(self.O, self._states[:-1], out=self._yo)
+        self._y += self._yo
+        x[...] = self._y.reshape(len(x), -1)
+        self.state[...] = self._states[-1]
+
+
+class HighPass(Biquad):
+    def __init__(self, chunk, channels, rate, cutoff=80.0, q=0.7071):
+        b, a = highpass_coefficients(rate, cutoff, q)
+        super().__init__(chunk, channels, b, a)
+
+
+class Meter:
+    """峰值 / RMS 电平表：峰值按 release_db_per_s 回落，RMS 按 integration_ms 平滑
+
+    每个 chunk 只做一次绝对值最大值和一次平方和；界面按自己的刷新率读取 peak_db / rms_db。
+    """
+
+    def __init__(self, chunk, channels, rate, release_db_per_s=20.0, integration_ms=300.0):
+        period = chunk / rate
+        self.decay = db_to_gain(-release_db_per_s * period)
+        self.alpha = 1 - math.exp(-period / (integration_ms / 1000))
+        self.peak = np.zeros(channels)
+        self.power = np.zeros(channels)
+        self._abs = np.zeros((chunk, channels), dtype=np.float32)
+        self._chunk_peak = np.zeros(channels, dtype=np.float32)
+        self._chunk_power = np.zeros(channels, dtype=np.float32)
+
+    def process(self, x):
+        mag = self._abs[:len(x)]
+        np.abs(x, out=mag)
+        np.max(mag, axis=0, out=self._chunk_peak)
+        np.einsum('ij,ij->j', x, x, out=self._chunk_power)
+        self._chunk_power /= len(x)
+        self.peak *= self.decay
+        np.maximum(self.peak, self._chunk_peak, out=self.peak)
+        self.power += self.alpha * (self._chunk_power - self.power)
+
+    @property
+    def peak_db(self):
+        return [round(gain_to_db(p), 1) for p in self.peak]
+
+    @property
+    def rms_db(self):
+        return [round(gain_to_db(math.sqrt(p)), 1) for p in self.power]
+
+
+STAGE_TYPES = {'gain': Gain, 'gate': NoiseGate, 'highpass': HighPass, 'meter': Meter}
+
+
+class DspChain:
+    """单个输入的处理链，各级依次原地处理引擎采样率下的一个 chunk
+
+    specs 为 [{'type': 'gain', 'db': 6}, {'type': 'gate', 'threshold_db': -50}, ...]，
+    末尾总是有一个电平表（meter）。cost 记录整条链每个 chunk 的耗时。
+    """
+
+    def __init__(self, chunk, channels, rate, specs=()):
+        self.specs = [dict(spec) for spec in specs]
+        self.stages = []
+        for spec in self.specs:
+            options = dict(spec)
+            kind = options.pop('type')
+            if kind not in STAGE_TYPES:
+                raise ValueError(f"未知的处理模块: {kind}")
+            self.stages.append(STAGE_TYPES[kind](chunk, channels, rate, **options))
+        self.meter = next((stage for stage in self.stages if isinstance(stage, Meter)), None)
+        if self.meter is None:
+            self.meter = Meter(chunk, channels, rate)
+            self.stages.append(self.meter)
+        self.cost = LatencyHistogram()
+
+    def process(self, x):
+        """原地处理 x，返回耗时（秒）"""
+        t0 = time.perf_counter()
+        for stage in self.stages:
+            stage.process(x)
+        elapsed = time.perf_counter() - t0
+        self.cost.record(elapsed)
+        return elapsed
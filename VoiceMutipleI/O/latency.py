@@ -0,0 +1,68 @@
+import collections
+import time
+
+# chunk：每个设备缓冲区 / 混音节拍的帧数；ring_chunks：输入环形缓冲区容量（chunk 数）；
+# input_headroom / output_target：输入、输出缓冲区的目标余量（设备块数）；queue_depth：输出队列深度
+LATENCY_PROFILES = {
+    'ultra-low': {'chunk': 128, 'ring_chunks': 8, 'input_headroom': 1.5, 'output_target': 1.5, 'queue_depth': 6},
+    'low': {'chunk': 256, 'ring_chunks': 8, 'input_headroom': 1.5, 'output_target': 1.5, 'queue_depth': 4},
+    'balanced': {'chunk': 512, 'ring_chunks': 4, 'input_headroom': 1.5, 'output_target': 1.5, 'queue_depth': 4},
+    'safe': {'chunk': 1024, 'ring_chunks': 4, 'input_headroom': 2.0, 'output_target': 2.0, 'queue_depth': 6},
+}
+PROFILE_ORDER = ('ultra-low', 'low', 'balanced', 'safe')
+
+
+def count_xruns(snapshot):
+    """快照中所有设备累计的 xrun：输入溢出/缺帧/丢弃，输出欠载/丢弃"""
+    total = 0
+    for inp in snapshot['inputs']:
+        total += inp['overflows'] + inp['misses'] + inp['drops']
+    for out in snapshot['outputs']:
+        total += out['underflows'] + out['underruns'] + out['dropped']
+    return total
+
+
+class LatencyAutoTuner:
+    """自动选择延迟档位：从最小的缓冲区开始，window 秒内出现 max_xruns 次 xrun 就升一档
+
+    check() 由界面定时器或 CLI 主循环定期调用。升档需要用新的 chunk 重新打开所有流，
+    由 engine.restart() 完成；每次（重新）启动后的 grace 秒内不计数，避开设备启动时的欠载。
+    已经是最大档位时不再改变。
+    """
+
+    def __init__(self, engine, max_xruns=3, window=10.0, grace=2.0):
+        self.engine = engine
+        self.max_xruns = max_xruns
+        self.window = window
+        self.grace = grace
+        self.upgrades = 0
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.history = collections.deque()
+
+    def check(self):
+        """返回升级后的档位名；没有变化时返回 None"""
+        now = time.monotonic()
+        xruns = count_xruns(self.engine.snapshot())
+        if now - self.started < self.grace:
+            self.history.clear()
+            self.history.append((now, xruns))
+            return None
+        self.history.append((now, xruns))
+        while len(self.history) > 1 and now - self.history[0][0] > self.window:
+            self.history.popleft()
+        if xruns - self.history[0][1] < self.max_xruns:
+            return None
+        position = PROFILE_ORDER.index(self.engine.profile) if self.engine.profile in PROFILE_ORDER else -1
+        if position + 1 >= len(PROFILE_ORDER):
+            self.history.clear()
+            self.history.append((now, xruns))
+            return None
+        profile = PROFILE_ORDER[position + 1]
+        print(f"检测到 {xruns - self.history[0][1]} 次 xrun，延迟档位升级为 {profile}")
+        self.engine.restart(profile)
+        self.upgrades += 1
+        self.reset()
+        return profile
@@ -0,0 +1,157 @@
+import numpy as np
+
+
+def fade_in_curve(chunk):
+    """一个 chunk 长的升余弦淡入曲线，(chunk, 1) 以便按帧广播到所有声道"""
+    ramp = 0.5 - 0.5 * np.cos(np.pi * (np.arange(chunk) + 0.5) / chunk)
+    return ramp.astype(np.float32)[:, None]
+
+
+class SoftLimiter:
+    """原地软限幅：阈值以下保持线性，超出部分用 tanh 平滑压缩到 ±1 以内"""
+
+    def __init__(self, frames, channels, threshold=0.8):
+        self.threshold = threshold
+        self.knee = 1.0 - threshold
+        self._mag = np.zeros((frames, channels), dtype=np.float32)
+        self._over = np.zeros((frames, channels), dtype=np.float32)
+        self._soft = np.zeros((frames, channels), dtype=np.float32)
+
+    def process(self, bus):
+        mag = self._mag[:len(bus)]
+        np.abs(bus, out=mag)
+        if mag.max() <= self.threshold:
+            return bus
+        over = self._over[:len(bus)]
+        soft = self._soft[:len(bus)]
+        np.subtract(mag, self.threshold, out=over)
+        np.maximum(over, 0, out=over)
+        np.multiply(over, 1.0 / self.knee, out=soft)
+        np.tanh(soft, out=soft)
+        soft *= self.knee
+        # bus -= sign(bus) * (超出量 - 压缩后的超出量)
+        np.subtract(over, soft, out=over)
+        np.copysign(over, bus, out=over)
+        bus -= over
+        return bus
+
+
+class PcmBuffer:
+    """可复用的 int16 输出字节缓冲区"""
+
+    def __init__(self, frames, channels):
+        self.channels = channels
+        self.raw = bytearray(frames * channels * 2)
+        self.samples = np.frombuffer(self.raw, dtype=np.int16).reshape(frames, channels)
+        self._scaled = np.zeros((frames, channels), dtype=np.float32)
+
+    def render(self, audio):
+        """把 (帧数, 声道数) 的 float32 写入缓冲区，返回字节视图"""
+        n = len(audio)
+        scaled = self._scaled[:n]
+        np.multiply(audio, 32767, out=scaled)
+        np.rint(scaled, out=scaled)
+        np.clip(scaled, -32768, 32767, out=scaled)
+        self.samples[:n] = scaled
+        return memoryview(self.raw)[:n * self.channels * 2]
+
+
+def int16_to_float(frames, out):
+    """把 int16 帧转换为 [-1, 1) 的 float32，写入预分配的 out 并返回其视图"""
+    work = out[:len(frames)]
+    # 先转换类型再原地缩放：int16 和浮点直接相乘会为类型转换分配临时缓冲区
+    np.copyto(work, frames)
+    work *= 1.0 / 32768
+    return work
+
+
+class Mixer:
+    """一个路由配置（一组输入流 + 一组输出流 + 增益矩阵）的不可变快照
+
+    所有输入声道按顺序排成 (chunk, 输入声道总数) 的矩阵，所有输出声道排成
+    (chunk, 输出声道总数) 的总线，每个 chunk 只做一次
+    bus = stack @ gains，立体声全程保留。总线经软限幅后按输出切片。
+    所有缓冲区在创建时分配一次，配置变化时整体替换为新的 Mixer。
+
+    过渡配置带有 fade_from（旧增益按本配置的布局重新排列，见 remap_gains）和
+    settled（过渡结束后使用的配置）：这一个 chunk 内增益从旧值交叉淡化到新值，
+    新加入的设备淡入，被移除的设备淡出。
+    """
+
+    def __init__(self, chunk, inputs, outputs, gains, fade_from=None, settled=None):
+        self.chunk = chunk
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.input_slices = _channel_slices(inputs)
+        self.output_slices = _channel_slices(outputs)
+        self.input_index = {item.idx: k for k, item in enumerate(self.inputs)}
+        self.output_index = {item.idx: j for j, item in enumerate(self.outputs)}
+        self.in_channels = sum(item.channels for item in inputs)
+        self.out_channels = sum(item.channels for item in outputs)
+        self.stack = np.zeros((chunk, self.in_channels), dtype=np.float32)
+        self.bus = np.zeros((chunk, self.out_channels), dtype=np.float32)
+        self.gains = _frozen(gains)
+        self.limiter = SoftLimiter(chunk, self.out_channels)
+        self.settled = settled
+        self.fade_gains = None
+        if fade_from is not None:
+            self.fade_gains = _frozen(fade_from)
+            self._fade_bus = np.zeros_like(self.bus)
+            self.fade_in = fade_in_curve(chunk)
+
+    def begin(self):
+        # 本节拍没有数据的输入保持静音
+        self.stack.fill(0)
+
+    def input_view(self, k):
+        """第 k 个输入在输入矩阵中的列视图，可直接作为转换目标"""
+        return self.stack[:, self.input_slices[k]]
+
+    def load_input(self, k, audio):
+        self.stack[:, self.input_slices[k]] = audio
+
+    def mix(self):
+        """一次矩阵乘法完成全部路由，软限幅后返回总线"""
+        np.matmul(self.stack, self.gains, out=self.bus)
+        if self.fade_gains is not None:
+            # 同一组输入分别按旧/新增益混音后线性交叉：bus = old + fade_in * (new - old)
+            np.matmul(self.stack, self.fade_gains, out=self._fade_bus)
+            self.bus -= self._fade_bus
+            self.bus *= self.fade_in
+            self.bus += self._fade_bus
+        return self.limiter.process(self.bus)
+
+    def output_view(self, j):
+        return self.bus[:, self.output_slices[j]]
+
+
+def remap_gains(mixer, inputs, outputs):
+    """把 mixer 的增益矩阵按流对象重新排列到 inputs × outputs 的布局，mixer 中没有的流为 0"""
+    gains = np.zeros((sum(item.channels for item in inputs), sum(item.channels for item in outputs)),
+                     dtype=np.float32)
+    if mixer is None:
+        return gains
+    old_in = {id(item): s for item, s in zip(mixer.inputs, mixer.input_slices)}
+    old_out = {id(item): s for item, s in zip(mixer.outputs, mixer.output_slices)}
+    out_pairs = [(new, old_out[id(item)]) for item, new in zip(outputs, _channel_slices(outputs))
+                 if id(item) in old_out]
+    for item, new in zip(inputs, _channel_slices(inputs)):
+        if id(item) in old_in:
+            for new_out, old in out_pairs:
+                gains[new, new_out] = mixer.gains[old_in[id(item)], old]
+    return gains
+
+
+def _frozen(gains):
+    gains = np.array(gains, dtype=np.float32)
+    gains.setflags(write=False)
+    return gains
+
+
+def _channel_slices(streams):
+    slices = []
+    offset = 0
+    for item in streams:
+        slices.append(slice(offset, offset + item.channels))
+        offset += item.channels
+    return slices
@@ -0,0 +1,96 @@
+import collections
+import threading
+import time
+
+from telemetry import LatencyHistogram
+
+QUEUE_POLICIES = ('drop_oldest', 'silence', 'block')
+
+
+class OutputWorker:
+    """单个输出设备的独立写入线程，带有界帧队列
+
+    混音线程只把混好的帧放进队列，由本线程阻塞地写入设备，因此一个慢速输出
+    （蓝牙、虚拟声卡）不会拖慢其它输出和下一次输入读取。队列已满时的策略：
+
+    - drop_oldest：丢弃最旧的一块，保证该输出始终播放最新的音频
+    - silence：丢弃新来的一块；队列空超过一个周期时写入静音，让设备保持运转
+    - block：混音线程最多等待 block_timeout 秒（反压），超时后丢弃最旧的一块
+    """
+
+    def __init__(self, stream, silence, period, frame_bytes, depth=4, policy='drop_oldest', block_timeout=None):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"未知的队列策略: {policy}")
+        self.stream = stream
+        self.depth = depth
+        self.policy = policy
+        self.period = period
+        self.frame_bytes = frame_bytes
+        self.block_timeout = block_timeout if block_timeout is not None else 2 * period
+        self.dropped = 0
+        self.underruns = 0
+        self.underflows = 0
+        self.write_time = LatencyHistogram()
+        self._silence = silence
+        self._queue = collections.deque()
+        self._queued_bytes = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def queue_depth(self):
+        return len(self._queue)
+
+    def queued_frames(self):
+        """队列中等待写入的帧数（漂移补偿据此判断输出设备的快慢）"""
+        return self._queued_bytes // self.frame_bytes
+
+    def put(self, block):
+        """由混音线程调用，block 为 bytes"""
+        with self._cond:
+            if len(self._queue) >= self.depth:
+                if self.policy == 'block':
+                    self._cond.wait_for(lambda: len(self._queue) < self.depth or not self._running,
+                                        self.block_timeout)
+                if self.policy == 'silence':
+                    self.dropped += 1
+                    return
+                if len(self._queue) >= self.depth:
+                    self._queued_bytes -= len(self._queue.popleft())
+                    self.dropped += 1
+            self._queue.append(block)
+            self._queued_bytes += len(block)
+            self._cond.notify_all()
+
+    def _next_block(self):
+        with self._cond:
+            timeout = self.period if self.policy == 'silence' else None
+            if not self._cond.wait_for(lambda: self._queue or not self._running, timeout):
+                self.underruns += 1
+                return self._silence
+            if not self._running:
+                return None
+            block = self._queue.popleft()
+            self._queued_bytes -= len(block)
+            self._cond.notify_all()
+            return block
+
+    def _run(self):
+        while self._running:
+            block = self._next_block()
+            if block is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                if self.stream.write(block):
+                    self.underflows += 1
+            except Exception as e:
+                print(f"写入输出流错误: {e}")
+            self.write_time.record(time.perf_counter() - t0)
+
+    def stop(self, timeout=1):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,168 @@
+import collections
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+RECORD_FORMATS = ('wav', 'flac')
+
+
+def flac_available():
+    try:
+        import soundfile  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class RecordingTap:
+    """录音分接点：混音线程把 float32 音频写进池化的 int16 块，后台线程写盘
+
+    push() 只从空闲块池中取一块、原地转换为 int16 后放进待写队列，不分配内存、
+    不加锁、不等待磁盘；池中没有空闲块（磁盘卡住太久）时丢弃这一块并计入 dropped。
+    写入线程把块按顺序写入带大缓冲区的文件（大块顺序写），写完后把块还回池中。
+
+    文件名为 {prefix}_{序号}.{wav|flac}；rotate_bytes / rotate_seconds 任一达到就换下一个文件。
+    format='flac' 需要 soundfile，不可用时退回 wav。part 为已经写过的文件数，接着上一个
+    分接点录音时序号从 part + 1 开始，不覆盖已有文件。options 保存创建参数，用于重新创建。
+    """
+
+    def __init__(self, prefix, rate, channels, chunk, format='wav', rotate_bytes=None, rotate_seconds=None,
+                 buffer_seconds=5.0, flush_bytes=1 << 20, part=0):
+        if format not in RECORD_FORMATS:
+            raise ValueError(f"未知的录音格式: {format}")
+        if format == 'flac' and not flac_available():
+            print("未安装 soundfile，录音改用 WAV 格式")
+            format = 'wav'
+        self.prefix = prefix
+        self.rate = rate
+        self.channels = channels
+        self.format = format
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.flush_bytes = flush_bytes
+        self.options = {'format': format, 'rotate_bytes': rotate_bytes, 'rotate_seconds': rotate_seconds,
+                        'buffer_seconds': buffer_seconds, 'flush_bytes': flush_bytes}
+        self.blocks = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.files = []
+        count = max(4, int(np.ceil(buffer_seconds * rate / chunk)))
+        self._pool = collections.deque(np.zeros((chunk, channels), dtype=np.int16) for _ in range(count))
+        self._pending = collections.deque()
+        self._scaled = np.zeros((chunk, channels), dtype=np.float32)
+        self._ready = threading.Event()
+        self._running = True
+        self._file = None
+        self._writer = None
+        self._part = part
+        self._part_frames = 0
+        self._part_bytes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def part(self):
+        """已经打开过的文件数"""
+        return self._part
+
+    def push(self, audio):
+        """由混音线程调用：audio 为 (帧数, 声道数) 的 float32"""
+        try:
+            block = self._pool.popleft()
+        except IndexError:
+            self.dropped += 1
+            return
+        n = len(audio)
+        scaled = self._scaled[:n]
+        np.multiply(audio, 32767, out=scaled)
+        np.rint(scaled, out=scaled)
+        np.clip(scaled, -32768, 32767, out=scaled)
+        block[:n] = scaled
+        self._pending.append((block, n))
+        self._ready.set()
+
+    def _open_part(self):
+        self._part += 1
+        path = f"{self.prefix}_{self._part:03d}.{self.format}"
+        if self.format == 'flac':
+            import soundfile
+            self._writer = soundfile.SoundFile(path, 'w', samplerate=self.rate, channels=self.channels,
+                                               format='FLAC', subtype='PCM_16')
+        else:
+            self._file = open(path, 'wb', buffering=self.flush_bytes)
+            self._writer = wave.open(self._file, 'wb')
+            self._writer.setnchannels(self.channels)
+            self._writer.setsampwidth(2)
+            self._writer.setframerate(self.rate)
+        self._part_frames = 0
+        self._part_bytes = 0
+        self.files.append(path)
+
+    def _close_part(self):
+        if self._writer is None:
+            return
+        try:
+            # wave 在 close() 时回填文件头中的长度
+            self._writer.close()
+            if self._file:
+                self._file.close()
+        except Exception as e:
+            print(f"关闭录音文件错误: {e}")
+        self._writer = None
+        self._file = None
+
+    def _write(self, block):
+        if self._writer is None:
+            self._open_part()
+        if self.format == 'flac':
+            self._writer.write(block)
+        else:
+            self._writer.writeframesraw(block)
+        size = block.nbytes
+        self._part_frames += len(block)
+        self._part_bytes += size
+        self.bytes_written += size
+        self.blocks += 1
+        if (self.rotate_bytes and self._part_bytes >= self.rotate_bytes) or \
+                (self.rotate_seconds and self._part_frames >= self.rotate_seconds * self.rate):
+            self._close_part()
+
+    def _run(self):
+        while True:
+            self._ready.wait(0.5)
+            self._ready.clear()
+            while self._pending:
+                block, n = self._pending.popleft()
+                try:
+                    self._write(block[:n])
+                except Exception as e:
+                    print(f"写入录音文件错误: {e}")
+                self._pool.append(block)
+            if not self._running and not self._pending:
+                break
+        self._close_part()
+
+    def stats(self):
+        return {
+            'prefix': self.prefix,
+            'format': self.format,
+            'files': list(self.files),
+            'blocks': self.blocks,
+            'dropped': self.dropped,
+            'bytes': self.bytes_written,
+            'pending': len(self._pending),
+        }
+
+    def close(self, timeout=5):
+        """停止接收新数据，写完队列中剩余的块后关闭文件"""
+        self._running = False
+        self._ready.set()
+        self._thread.join(timeout=timeout)
+
+
+def recording_prefix(directory, name):
+    return os.path.join(directory, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}")
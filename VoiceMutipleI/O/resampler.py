@@ -0,0 +1,142 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def kernel_table(src_rate, dst_rate, taps=16, phases=256):
+    """按采样率对缓存的多相插值滤波器表，形状为 (phases + 1, taps)
+
+    第 p 行是分数延迟 p / phases 处的 Blackman 窗 sinc 系数；降采样时截止频率
+    按目标采样率收窄以抗混叠。每行归一化为 1，保证直流增益不变。
+    """
+    half = taps // 2
+    cutoff = 0.95 * min(1.0, dst_rate / src_rate)
+    frac = np.arange(phases + 1, dtype=np.float64)[:, None] / phases
+    offsets = np.arange(-half + 1, half + 1, dtype=np.float64)[None, :]
+    d = frac - offsets
+    window = 0.42 + 0.5 * np.cos(np.pi * d / half) + 0.08 * np.cos(2 * np.pi * d / half)
+    table = cutoff * np.sinc(cutoff * d) * window
+    table /= table.sum(axis=1, keepdims=True)
+    table = table.astype(np.float32)
+    table.flags.writeable = False
+    return table
+
+
+class Resampler:
+    """有状态的流式重采样器（float32 交错帧，形状 (frames, channels)）
+
+    跨 chunk 保留 taps 帧历史和小数读位置，因此连续调用的输出与一次性处理整段
+    信号一致。采样率相同时直接透传，不做任何计算。所有中间数组预先分配并按需
+    扩容，稳态下 process() 不再分配数组（只有几个切片视图对象）；返回的数组在下一次调用前有效。
+
+    adaptive=True 时即使采样率相同也始终重采样，以便随时通过 ratio 微调转换比例
+    （时钟漂移补偿）；ratio > 1 表示每个输出样本消耗更多输入。
+    """
+
+    def __init__(self, src_rate, dst_rate, channels, taps=16, adaptive=False):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.channels = channels
+        self.taps = taps
+        self.half = taps // 2
+        self.passthrough = src_rate == dst_rate and not adaptive
+        self.ratio = 1.0
+        self.table = kernel_table(src_rate, dst_rate, taps)
+        self.phases = len(self.table) - 1
+        self._offsets = range(-self.half + 1, self.half + 1)
+        # _buf[:taps] 始终保存上一次调用留下的历史帧
+        self._buf = np.zeros((taps, channels), dtype=np.float32)
+        self._reserve_out(0)
+        # 下一个输出样本的位置（以输入样本为单位，相对于历史缓冲区起点）
+        self._pos = float(self.half)
+
+    def _reserve_in(self, n_in):
+        if self.taps + n_in > len(self._buf):
+            buf = np.zeros((2 * (self.taps + n_in), self.channels), dtype=np.float32)
+            buf[:self.taps] = self._buf[:self.taps]
+            self._buf = buf
+
+    def _reserve_out(self, n_out):
+        if n_out and n_out <= len(self._ramp):
+            return
+        size = 2 * n_out
+        self._ramp = np.arange(size, dtype=np.float64)
+        self._t = np.zeros(size, dtype=np.float64)
+        self._floor = np.zeros(size, dtype=np.float64)
+        self._i = np.zeros(size, dtype=np.int64)
+        self._phase = np.zeros(size, dtype=np.int64)
+        # 按 (taps, 帧数) 排列，每次从一维缓冲区中切出连续的视图
+        self._idx = np.zeros(size * self.taps, dtype=np.int64)
+        self._weights = np.zeros((size, self.taps), dtype=np.float32)
+        self._frames = np.zeros(size * self.taps * self.channels, dtype=np.float32)
+        self._out = np.zeros((size, self.channels), dtype=np.float32)
+
+    @property
+    def step(self):
+        """每个输出样本前进的输入样本数"""
+        return self.src_rate / self.dst_rate * self.ratio
+
+    def frames_needed(self, n_out):
+        """恰好产生 n_out 个输出帧所需的输入帧数"""
+        if self.passthrough:
+            return n_out
+        last = self._pos + (n_out - 1) * self.step
+        return max(0, int(last) + self.half + 1 - self.taps)
+
+    def delay(self):
+        """滤波器的群延迟（秒）"""
+        return 0.0 if self.passthrough else self.half / self.src_rate
+
+    def max_output(self, n_in):
+        """输入 n_in 帧时最多可能产生的输出帧数（用于预分配）"""
+        if self.passthrough:
+            return n_in
+        return int(np.ceil(n_in * self.dst_rate / self.src_rate * 1.01)) + 2
+
+    def process(self, x, n_out=None):
+        """重采样 x；n_out 为 None 时输出当前能算出的全部帧
+
+        指定 n_out 时，x 的长度应为 frames_needed(n_out)。
+        """
+        if self.passthrough:
+            return x
+        n_in = len(x)
+        total = self.taps + n_in
+        self._reserve_in(n_in)
+        buf = self._buf[:total]
+        buf[self.taps:] = x
+        step = self.step
+        if n_out is None:
+            limit = total - self.half
+            n_out = max(0, int(np.ceil((limit - self._pos) / step)))
+        self._reserve_out(n_out)
+
+        t = self._t[:n_out]
+        np.multiply(self._ramp[:n_out], step, out=t)
+        t += self._pos
+        # t 非负，modf 的整数部分就是向下取整；不和整数数组混合运算，避免类型转换的临时数组
+        i = self._i[:n_out]
+        floor = self._floor[:n_out]
+        np.modf(t, out=(t, floor))
+        np.copyto(i, floor, casting='unsafe')
+        t *= self.phases
+        np.rint(t, out=t)
+        phase = self._phase[:n_out]
+        np.copyto(phase, t, casting='unsafe')
+        # 广播的 np.add 会为缓冲迭代分配临时数组，所以每个抽头单独做一次一维加法；
+        # idx / frames 按抽头在前排列，每行都是连续内存
+        idx = self._idx[:self.taps * n_out].reshape(self.taps, n_out)
+        for k, offset in enumerate(self._offsets):
+            np.add(i, offset, out=idx[k])
+        frames = self._frames[:self.taps * n_out * self.channels].reshape(self.taps, n_out, self.channels)
+        # 默认 mode='raise' 会先写临时数组再复制到 out；下标按构造不会越界
+        np.take(buf, idx, axis=0, out=frames, mode='clip')
+        weights = self._weights[:n_out]
+        np.take(self.table, phase, axis=0, out=weights, mode='clip')
+        out = self._out[:n_out]
+        np.einsum('nt,tnc->nc', weights, frames, out=out)
+
+        buf[:self.taps] = buf[n_in:total]
+        self._pos += n_out * step - n_in
+        return out
@@ -0,0 +1,183 @@
+"""无界面的音频路由器：按 JSON 配置文件运行，可作为后台服务
+
+配置示例::
+
+    {
+        "backend": "pyaudio",
+        "sample_rate": 48000,
+        "chunk": 1024,
+        "inputs": [1, "Microphone"],
+        "outputs": ["Speakers", "CABLE Input"],
+        "routes": {"routes": [["Microphone", "CABLE Input", 0.0]]},
+        "queue_policy": "drop_oldest",
+        "queue_depth": 4,
+        "stats_log": "router_stats.jsonl",
+        "stats_interval": 1.0,
+        "device_cache": "device_cache.json",
+        "latency_profile": "low",
+        "record": {"dir": "recordings", "format": "flac", "outputs": true, "inputs": false,
+                   "rotate_mb": 500, "rotate_minutes": 60},
+        "dsp": {"Microphone": [{"type": "highpass", "cutoff": 80}, {"type": "gate", "threshold_db": -50},
+                               {"type": "gain", "db": 6}]}
+    }
+
+设备可以写索引，也可以写名称（不区分大小写的子串匹配）。device_cache 为设备
+能力缓存文件（可选），设置后再次启动不用重新探测设备支持的采样率。latency_profile
+为 ultra-low / low / balanced / safe 之一，或 auto（从最小档位开始，出现 xrun 时自动升级），
+设置后覆盖 chunk。record（可选）把每个输出的混音总线和/或每个输入录制到 dir 目录，
+按 rotate_mb / rotate_minutes 分文件。dsp（可选）为输入设置处理链（gain / gate / highpass），
+按顺序在混音前处理，每个输入都会带一个电平表。
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+
+from audio_backends import BACKENDS, create_backend
+from audio_engine import RoutingEngine
+from device_registry import DeviceRegistry
+from latency import PROFILE_ORDER, LatencyAutoTuner
+from recorder import recording_prefix
+from routing_matrix import RoutingMatrix
+from telemetry import TelemetryLogger
+
+
+def resolve_device(devices, ref, is_input):
+    """按索引或名称子串查找设备，返回 (idx, name, dev)"""
+    key = 'maxInputChannels' if is_input else 'maxOutputChannels'
+    candidates = [dev for dev in devices if dev[key] > 0]
+    if isinstance(ref, int):
+        matches = [dev for dev in candidates if dev['index'] == ref]
+    else:
+        matches = [dev for dev in candidates if str(ref).lower() in dev['name'].lower()]
+    if matches:
+        return matches[0]['index'], matches[0]['name'], matches[0]
+    kind = "输入" if is_input else "输出"
+    raise ValueError(f"找不到{kind}设备: {ref}")
+
+
+def resolve_routes(data, devices):
+    """把路由表中按名称写的设备换成索引"""
+    def ref(value, is_input):
+        return value if isinstance(value, int) else resolve_device(devices, value, is_input)[0]
+
+    resolved = dict(data)
+    resolved['routes'] = [[ref(i, True), ref(o, False), gain] for i, o, gain in data.get('routes', [])]
+    resolved['channel_routes'] = [[ref(i, True), ic, ref(o, False), oc, gain]
+                                  for i, ic, o, oc, gain in data.get('channel_routes', [])]
+    return RoutingMatrix.from_dict(resolved)
+
+
+def list_devices(backend):
+    for dev in backend.list_devices():
+        print(f"[{dev['index']:3}] 输入 {dev['maxInputChannels']:2}  输出 {dev['maxOutputChannels']:2}  "
+              f"{int(dev['defaultSampleRate']):6} Hz  {dev['name']}")
+
+
+def build_engine(config, backend):
+    registry = DeviceRegistry(backend, config.get('device_cache'))
+    if config.get('device_cache'):
+        # 只探测缓存中没有的设备并写回缓存文件，之后启动时不用再探测
+        registry.warm()
+    engine = RoutingEngine(backend,
+                           sample_rate=config.get('sample_rate', 44100),
+                           chunk=config.get('chunk', 1024),
+                           output_queue_depth=config.get('queue_depth', 4),
+                           output_queue_policy=config.get('queue_policy', 'drop_oldest'),
+                           registry=registry)
+    profile = config.get('latency_profile')
+    if profile:
+        engine.apply_profile(PROFILE_ORDER[0] if profile == 'auto' else profile)
+    devices = backend.list_devices()
+    inputs = [resolve_device(devices, ref, True) for ref in config.get('inputs', [])]
+    outputs = [resolve_device(devices, ref, False) for ref in config.get('outputs', [])]
+    if not inputs or not outputs:
+        raise ValueError("配置中至少需要一个输入和一个输出设备")
+    if 'routes' in config:
+        engine.routes = resolve_routes(config['routes'], devices)
+    for ref, specs in config.get('dsp', {}).items():
+        ref = int(ref) if ref.isdigit() else ref
+        engine.set_input_chain(resolve_device(devices, ref, True)[0], specs)
+    return engine, inputs, outputs
+
+
+def start_recordings(engine, record):
+    options = {'format': record.get('format', 'wav')}
+    if record.get('rotate_mb'):
+        options['rotate_bytes'] = int(record['rotate_mb'] * 1e6)
+    if record.get('rotate_minutes'):
+        options['rotate_seconds'] = record['rotate_minutes'] * 60
+    directory = record.get('dir', 'recordings')
+    if record.get('outputs', True):
+        for out in engine.output_streams:
+            engine.start_recording('output', out.idx, recording_prefix(directory, f"mix_out{out.idx}"), **options)
+    if record.get('inputs', False):
+        for inp in engine.input_streams:
+            engine.start_recording('input', inp.idx, recording_prefix(directory, f"in{inp.idx}"), **options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面音频路由器 Headless Audio Router")
+    parser.add_argument("config", nargs="?", help="JSON 路由配置文件")
+    parser.add_argument("--backend", choices=BACKENDS, help="覆盖配置文件中的音频后端")
+    parser.add_argument("--list-devices", action="store_true", help="列出设备后退出")
+    parser.add_argument("--duration", type=float, default=0, help="运行秒数，0 表示一直运行直到 Ctrl+C")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            config = json.load(f)
+    backend = create_backend(args.backend or config.get('backend'))
+
+    try:
+        if args.list_devices or not args.config:
+            list_devices(backend)
+            return 0
+
+        engine, inputs, outputs = build_engine(config, backend)
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        engine.on_error = lambda e: stop.set()
+
+        engine.start(inputs, outputs)
+        if config.get('record'):
+            start_recordings(engine, config['record'])
+        logger = None
+        if config.get('stats_log'):
+            logger = TelemetryLogger(engine.snapshot, config['stats_log'], config.get('stats_interval', 1.0))
+        print(f"路由中: {[name for _, name, _ in inputs]} -> {[name for _, name, _ in outputs]}")
+        tuner = LatencyAutoTuner(engine) if config.get('latency_profile') == 'auto' else None
+        deadline = time.monotonic() + args.duration if args.duration else None
+        try:
+            while not stop.wait(0.5):
+                if deadline and time.monotonic() >= deadline:
+                    break
+                if tuner:
+                    tuner.check()
+        finally:
+            routes = engine.route_latencies()
+            recordings = [dict(tap.stats(), kind=kind, idx=idx) for kind, idx, tap in engine.taps]
+            if logger:
+                logger.stop()
+            engine.stop()
+            # 运行中打开失败的设备会从缓存中删除，下次启动时重新探测
+            with engine.registry.lock:
+                engine.registry.save_cache()
+        stats = engine.snapshot()
+        print(f"已停止: {stats['cycles']} 个 chunk, p99 {stats['timing']['chunk']['p99_ms']:.2f} ms"
+              f"（处理链 p99 {stats['timing']['dsp']['p99_ms']:.2f} ms）")
+        for rec in recordings:
+            print(f"  录音 {rec['kind']}[{rec['idx']}]: {', '.join(rec['files'])}（丢弃 {rec['dropped']} 块）")
+        for route in routes:
+            print(f"  [{route['input']}] -> [{route['output']}] 延迟 {route['latency_ms']:.1f} ms")
+        return 0
+    finally:
+        backend.terminate()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def default_channel_map(in_channels, out_channels):
+    """设备间默认的声道映射：同声道数一一对应，单声道铺满，多声道到单声道取平均"""
+    if in_channels == out_channels:
+        return np.eye(in_channels, dtype=np.float32)
+    if in_channels == 1:
+        return np.ones((1, out_channels), dtype=np.float32)
+    if out_channels == 1:
+        return np.full((in_channels, 1), 1.0 / in_channels, dtype=np.float32)
+    channel_map = np.zeros((in_channels, out_channels), dtype=np.float32)
+    for c in range(in_channels):
+        channel_map[c, c % out_channels] = 1.0
+    return channel_map
+
+
+class RoutingMatrix:
+    """按设备索引保存的 N×M 路由表
+
+    routes 保存设备级增益（未设置时为 default_gain，0 表示不路由）；
+    channel_routes 可以覆盖单个声道到声道的增益，例如只把左声道送到耳机。
+    build() 把它展开成 Mixer 使用的 (输入声道总数, 输出声道总数) 增益矩阵。
+    """
+
+    def __init__(self, default_gain=1.0):
+        self.default_gain = default_gain
+        self.routes = {}
+        self.channel_routes = {}
+
+    def gain(self, in_idx, out_idx):
+        return self.routes.get((in_idx, out_idx), self.default_gain)
+
+    def set_gain(self, in_idx, out_idx, gain):
+        self.routes[(in_idx, out_idx)] = float(gain)
+
+    def set_channel_gain(self, in_idx, in_channel, out_idx, out_channel, gain):
+        self.channel_routes[(in_idx, in_channel, out_idx, out_channel)] = float(gain)
+
+    def build(self, inputs, outputs):
+        """inputs / outputs: 带 idx 和 channels 属性的流对象列表"""
+        in_channels = sum(item.channels for item in inputs)
+        out_channels = sum(item.channels for item in outputs)
+        gains = np.zeros((in_channels, out_channels), dtype=np.float32)
+        row = 0
+        for inp in inputs:
+            col = 0
+            for out in outputs:
+                block = gains[row:row + inp.channels, col:col + out.channels]
+                block[:] = default_channel_map(inp.channels, out.channels) * self.gain(inp.idx, out.idx)
+                for (in_idx, in_ch, out_idx, out_ch), gain in self.channel_routes.items():
+                    if in_idx == inp.idx and out_idx == out.idx and in_ch < inp.channels and out_ch < out.channels:
+                        block[in_ch, out_ch] = gain
+                col += out.channels
+            row += inp.channels
+        return gains
+
+    def to_dict(self):
+        return {
+            'default_gain': self.default_gain,
+            'routes': [[in_idx, out_idx, gain] for (in_idx, out_idx), gain in self.routes.items()],
+            'channel_routes': [[*key, gain] for key, gain in self.channel_routes.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        matrix = cls(data.get('default_gain', 1.0))
+        for in_idx, out_idx, gain in data.get('routes', []):
+            matrix.set_gain(in_idx, out_idx, gain)
+        for in_idx, in_ch, out_idx, out_ch, gain in data.get('channel_routes', []):
+            matrix.set_channel_gain(in_idx, in_ch, out_idx, out_ch, gain)
+        return matrix
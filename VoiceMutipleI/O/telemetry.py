@@ -0,0 +1,115 @@
+import bisect
+import json
+import threading
+
+# 直方图桶的上界（微秒），最后一个桶收集所有更慢的样本
+BUCKET_BOUNDS_US = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+class LatencyHistogram:
+    """固定桶的耗时直方图，record() 只做一次二分查找和几次加法"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_US, seconds * 1e6)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """返回第 p 百分位所在桶的上界（毫秒）；落在最后一个桶时返回最大值"""
+        if not self.count:
+            return 0.0
+        target = p / 100 * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target:
+                if i < len(BUCKET_BOUNDS_US):
+                    return BUCKET_BOUNDS_US[i] / 1000
+                break
+        return self.max * 1000
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max * 1000,
+            'total_s': self.total,
+            'buckets_us': list(BUCKET_BOUNDS_US),
+            'counts': list(self.counts),
+        }
+
+
+class EngineTelemetry:
+    """混音线程的计时统计：整个 chunk 以及 read / mix / write 三个阶段
+
+    dsp 是 read 阶段中所有输入处理链的耗时之和（包含在 read 内）。
+    只由混音线程写入；其它线程读取到的是略微滞后但足够准确的数值。
+    """
+
+    STAGES = ('chunk', 'read', 'dsp', 'mix', 'write')
+
+    def __init__(self):
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.cycles = 0
+        self.idle_cycles = 0
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.cycles = 0
+        self.idle_cycles = 0
+
+    def record_cycle(self, t0, t_read, t_mix, t_write, dsp=0.0):
+        """记录一次混音的各阶段时间点（time.perf_counter() 的返回值），dsp 为处理链耗时（秒）"""
+        h = self.histograms
+        h['read'].record(t_read - t0)
+        h['dsp'].record(dsp)
+        h['mix'].record(t_mix - t_read)
+        h['write'].record(t_write - t_mix)
+        h['chunk'].record(t_write - t0)
+        self.cycles += 1
+
+    def to_dict(self):
+        return {
+            'cycles': self.cycles,
+            'idle_cycles': self.idle_cycles,
+            'timing': {stage: h.to_dict() for stage, h in self.histograms.items()},
+        }
+
+
+class TelemetryLogger:
+    """后台线程，定期把 snapshot_fn() 的结果追加为一行 JSON"""
+
+    def __init__(self, snapshot_fn, path, interval=1.0):
+        self.snapshot_fn = snapshot_fn
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while not self._stop.wait(self.interval):
+                try:
+                    f.write(json.dumps(self.snapshot_fn(), ensure_ascii=False) + "\n")
+                    f.flush()
+                except Exception as e:
+                    print(f"写入统计日志错误: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from yt_dlp.extractor import gen_extractor_classes
+from yt_dlp.utils import make_archive_id
+
+ARCHIVE_NAME = '.download_archive.sqlite3'
+# 提取结果中的视频地址一般几个小时后过期，缓存时间不要太长
+METADATA_TTL = 3 * 3600
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS downloads (
+    key TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    url TEXT,
+    path TEXT NOT NULL,
+    sha256 TEXT,
+    size INTEGER,
+    finished REAL,
+    PRIMARY KEY (key, profile)
+);
+CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url, profile);
+CREATE TABLE IF NOT EXISTS metadata (
+    url TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    fetched REAL NOT NULL
+);
+'''
+
+_extractors = None
+
+
+def find_extractor(url):
+    """按 yt-dlp 的顺序找第一个 suitable() 的提取器（不联网）；只有通用提取器能处理时返回 None"""
+    global _extractors
+    if _extractors is None:
+        _extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+    for ie in _extractors:
+        if ie.suitable(url):
+            return ie
+    return None
+
+
+def offline_key(url):
+    """不联网算出 '提取器 视频ID'（和 yt-dlp --download-archive 的格式相同），认不出时返回 None
+
+    用 find_extractor() 找到的提取器的 get_temp_id() 从 URL 中取出 ID。
+    通用提取器（generic）没有固定的 URL 格式，这类链接按 URL 查找记录。
+    """
+    ie = find_extractor(url)
+    temp_id = ie.get_temp_id(url) if ie else None
+    return make_archive_id(ie.ie_key(), temp_id) if temp_id else None
+
+
+def info_key(info):
+    """提取之后的 '提取器 视频ID'"""
+    return make_archive_id(info['extractor_key'], info['id'])
+
+
+class DownloadArchive:
+    """保存在下载目录中的下载记录和元数据缓存（SQLite）
+
+    downloads 表按 (提取器 视频ID, 格式档位) 记录输出文件、大小和 SHA-256，
+    提交任务时按主键（或 URL 索引）查一次就能跳过已完成的视频，不需要任何网络请求；
+    文件已被删除时重新下载。metadata 表缓存 extract_info() 的结果 ttl 秒，
+    失败后重试同一批链接时不用重新提取。
+
+    下载线程和后处理结果线程都会访问，所有操作在同一把锁下进行。
+    """
+
+    def __init__(self, path, ttl=METADATA_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    @classmethod
+    def in_folder(cls, folder, **kwargs):
+        return cls(os.path.join(folder, ARCHIVE_NAME), **kwargs)
+
+    def lookup(self, key, url, profile):
+        """已完成且文件仍然存在时返回记录 dict，否则返回 None"""
+        with self._lock:
+            if key:
+                row = self._db.execute('SELECT key, url, path, sha256, size, finished FROM downloads '
+                                       'WHERE key = ? AND profile = ?', (key, profile)).fetchone()
+            else:
+                row = self._db.execute('SELECT key, url, path, sha256, size, finished FROM downloads '
+                                       'WHERE url = ? AND profile = ?', (url, profile)).fetchone()
+        if row is None or not os.path.exists(row[2]):
+            return None
+        return dict(zip(('key', 'url', 'path', 'sha256', 'size', 'finished'), row))
+
+    def record(self, key, url, profile, path, sha256=None, size=None):
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (key, profile, url, path, sha256, size, time.time()))
+
+    def cached_info(self, url):
+        """ttl 内提取过的信息（sanitize_info() 之后的 dict），没有或已过期时返回 None"""
+        with self._lock:
+            row = self._db.execute('SELECT info, fetched FROM metadata WHERE url = ?', (url,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def store_info(self, url, info):
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)',
+                             (url, json.dumps(info, ensure_ascii=False), time.time()))
+
+    def drop_info(self, url):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM metadata WHERE url = ?', (url,))
+
+    def prune(self):
+        """删除过期的元数据缓存"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM metadata WHERE fetched < ?', (time.time() - self.ttl,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,230 @@
+"""下载吞吐基准测试（不需要联网）
+
+生成若干个合成的 WAV 文件，用本机 HTTP 服务器提供，经 yt-dlp 的通用提取器（直链）下载，
+在不同的同时下载数下测量 items/s、MB/s 和后处理时间。服务器可以模拟每个请求的响应延迟
+和每个连接的带宽上限，让结果接近真实网站（本机回环的带宽远高于真实网络）。
+结果保存为 JSON，可与之前的结果对比::
+
+    python bench_downloader.py                                   # 同时下载数 1,2,4,8
+    python bench_downloader.py --levels 1,4,16 --items 32 --size-mb 8
+    python bench_downloader.py --server-rate 0 --latency 0       # 不模拟网络，只测本机开销
+    python bench_downloader.py -o new.json --compare old.json
+
+没有安装 FFmpeg 时自动改为 --no-convert（只测下载）。
+"""
+import argparse
+import functools
+import http.server
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yt_dlp
+
+from download_scheduler import FORMAT_PROFILES
+from downloader_cli import MB, run_batch
+
+SAMPLE_RATE = 44100
+
+
+def write_wav(path, size, seed):
+    """写一个约 size 字节的 16 位立体声 WAV，内容为伪随机噪声（转码时不会被轻易压缩）"""
+    frames = max(1, (size - 44) // 4)
+    data_size = frames * 4
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, 2,
+                         SAMPLE_RATE, SAMPLE_RATE * 4, 4, 16, b'data', data_size)
+    block = random.Random(seed).randbytes(1 << 16)
+    with open(path, 'wb') as f:
+        f.write(header)
+        remaining = data_size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def make_media(folder, items, size):
+    names = []
+    for i in range(items):
+        name = f"bench_{i + 1:03d}.wav"
+        write_wav(os.path.join(folder, name), size, i)
+        names.append(name)
+    return names
+
+
+class ThrottledHandler(http.server.SimpleHTTPRequestHandler):
+    """静态文件服务：每个请求先等待 latency 秒，每个连接最多 rate 字节/秒（0 表示不限）"""
+
+    latency = 0.0
+    rate = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().send_head()
+
+    def copyfile(self, source, outputfile):
+        block = 64 * 1024
+        start = time.monotonic()
+        sent = 0
+        while True:
+            data = source.read(block)
+            if not data:
+                break
+            try:
+                outputfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # 通用提取器只读开头几个字节判断是不是媒体文件，随后断开连接
+                return
+            sent += len(data)
+            if self.rate:
+                ahead = sent / self.rate - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+def start_server(folder, latency=0.0, rate=0):
+    handler = type('Handler', (ThrottledHandler,), {'latency': latency, 'rate': rate})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=folder))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_level(urls, folder, workers, profile, convert):
+    """用 workers 个下载线程下载一遍，不使用下载记录，每次写入新的目录"""
+    report = run_batch(urls, folder, profile, workers=workers, archive=False, convert=convert,
+                       ydl_options={'no_warnings': True}, on_update=None)
+    items = report['items']
+    done = [item for item in items if item['state'] == 'done']
+    post = [item['timings']['postprocess'] for item in done if item['timings']['postprocess'] is not None]
+    download = [item['timings']['download'] for item in done if item['timings']['download'] is not None]
+    return {
+        'workers': workers,
+        'items': len(items),
+        'done': len(done),
+        'failed': report['counts']['failed'],
+        'seconds': report['seconds'],
+        'items_per_second': report['items_per_second'],
+        'mb_per_second': report['mb_per_second'],
+        'download_seconds_mean': sum(download) / len(download) if download else None,
+        'postprocess_seconds_mean': sum(post) / len(post) if post else None,
+        'postprocess_cpu_seconds': sum(item['post_seconds'] for item in done),
+        'errors': sorted({item['error'] for item in items if item['error']}),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'ffmpeg': shutil.which('ffmpeg'),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, threshold=0.10):
+    """按同时下载数对比 items/s，返回回退的档位数"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['workers']: r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\n对比 {baseline_path}（阈值 {threshold:.0%}）")
+    for r in results:
+        old = baseline.get(r['workers'])
+        if not old or not old['items_per_second'] or not r['items_per_second']:
+            continue
+        change = r['items_per_second'] / old['items_per_second'] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  ⚠ 回退"
+            regressions += 1
+        print(f"同时下载 {r['workers']:3}  items/s {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="下载吞吐基准测试（离线）")
+    parser.add_argument("--levels", default="1,2,4,8", help="要测试的同时下载数，逗号分隔")
+    parser.add_argument("--items", type=int, default=16, help="文件数")
+    parser.add_argument("--size-mb", type=float, default=4, help="每个文件的大小（MB）")
+    parser.add_argument("-f", "--format", choices=FORMAT_PROFILES, default="mp3", help="下载格式")
+    parser.add_argument("--latency", type=float, default=0.05, help="服务器每个请求的响应延迟（秒）")
+    parser.add_argument("--server-rate", type=float, default=8, help="服务器每个连接的带宽（MB/s），0 表示不限")
+    parser.add_argument("--no-convert", action="store_true", help="不转换格式，只测下载")
+    parser.add_argument("-o", "--output", default="bench_downloader.json", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    try:
+        levels = [int(level) for level in args.levels.split(',') if level.strip()]
+    except ValueError:
+        parser.error("--levels 必须是逗号分隔的整数")
+    if not levels or min(levels) < 1 or args.items < 1:
+        parser.error("同时下载数和文件数至少为 1")
+    convert = not args.no_convert
+    if convert and not (shutil.which('ffmpeg') and shutil.which('ffprobe')):
+        print("警告: 没有找到 FFmpeg，只测试下载（--no-convert）")
+        convert = False
+
+    with tempfile.TemporaryDirectory(prefix='bench_downloader_') as tmp:
+        media = os.path.join(tmp, 'media')
+        os.makedirs(media)
+        names = make_media(media, args.items, int(args.size_mb * MB))
+        server = start_server(media, args.latency, args.server_rate * MB)
+        try:
+            host, port = server.server_address[:2]
+            urls = [f"http://{host}:{port}/{name}" for name in names]
+            print(f"{args.items} 个文件 × {args.size_mb} MB，格式 {args.format.upper()}"
+                  f"{'' if convert else '（不转换）'}，响应延迟 {args.latency * 1000:.0f} ms，"
+                  f"每连接 {args.server_rate or '不限'} MB/s")
+            print(f"{'同时下载':>8} {'用时 s':>8} {'items/s':>8} {'MB/s':>8} {'下载 s':>8} {'后处理 s':>8} "
+                  f"{'转换 CPU s':>10} {'失败':>5}")
+            results = []
+            for workers in levels:
+                r = run_level(urls, os.path.join(tmp, f'out_{workers}'), workers, args.format, convert)
+                results.append(r)
+                print(f"{workers:8} {r['seconds']:8.2f} {r['items_per_second']:8.2f} {r['mb_per_second']:8.1f} "
+                      f"{r['download_seconds_mean'] or 0:8.2f} {r['postprocess_seconds_mean'] or 0:8.2f} "
+                      f"{r['postprocess_cpu_seconds']:10.2f} {r['failed']:5}")
+                for error in r['errors']:
+                    print(f"    错误: {error}")
+                shutil.rmtree(os.path.join(tmp, f'out_{workers}'), ignore_errors=True)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    settings = {'items': args.items, 'size_mb': args.size_mb, 'format': args.format, 'convert': convert,
+                'latency': args.latency, 'server_rate_mb': args.server_rate}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'settings': settings, 'results': results}, f, indent=2,
+                  ensure_ascii=False)
+    print(f"\n结果已保存到 {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 1 if any(r['failed'] for r in results) else 0
+
+
+if __name__ == "__main__":
+    # 转换格式使用进程池
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,473 @@
+import collections
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import yt_dlp
+
+from archive import info_key, offline_key
+from postprocess import PostProcessPipeline, checksum_file, process_file
+
+# 任务状态
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+POSTPROCESSING = 'postprocessing'
+DONE = 'done'
+FAILED = 'failed'
+JOB_STATES = (QUEUED, DOWNLOADING, POSTPROCESSING, DONE, FAILED)
+
+FORMAT_PROFILES = ('mp3', 'mp4')
+
+# 同一个站点的不同域名共用一个并发限制
+HOST_ALIASES = {'youtu.be': 'youtube.com', 'youtube-nocookie.com': 'youtube.com'}
+
+
+def format_options(format_type, path):
+    """按格式档位生成 YoutubeDL 参数
+
+    转换为 mp3 / mp4 不在这里做，由 PostProcessPipeline 在进程池中完成；
+    mp4 的视频和音频合并只是复制流，仍由 yt-dlp 在下载后直接完成。
+    """
+    if format_type == "mp3":
+        ydl_opts = {
+            'format': 'bestaudio/best',  # 只下载最佳音频
+            'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),  # 文件名格式
+        }
+    elif format_type == "mp4":
+        ydl_opts = {
+            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best',  # 下载最佳视频
+            'merge_output_format': 'mp4',  # 合并为mp4格式
+            'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),  # 文件名格式
+        }
+    else:
+        raise ValueError(f"未知的下载格式: {format_type}")
+    # 多个任务同时下载，进度改由 progress_hooks 汇报，不再输出到控制台
+    ydl_opts['quiet'] = True
+    ydl_opts['noprogress'] = True
+    # 中断的下载保留 .part 文件，下次从断点继续
+    ydl_opts['continuedl'] = True
+    return ydl_opts
+
+
+def downloaded_files(info):
+    """extract_info() 结果中实际下载（合并后）的文件路径；播放列表逐项收集"""
+    if not info:
+        return []
+    if info.get('entries') is not None:
+        return [path for entry in info['entries'] for path in downloaded_files(entry)]
+    return [d['filepath'] for d in info.get('requested_downloads', []) if d.get('filepath')]
+
+
+def url_host(url):
+    """并发限制按站点计算：去掉 www. / m. 等前缀"""
+    host = (urlparse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return HOST_ALIASES.get(host, host)
+
+
+class TokenBucket:
+    """全局带宽上限：每秒补充 rate 字节，最多积攒 burst 字节；rate 为 None 或 0 时不限速
+
+    consume() 先扣额度（可以扣成负数），再让调用线程睡眠到额度恢复为止，
+    多个下载线程共用同一个桶时总速率不超过 rate。
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or rate or 0
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n):
+        """返回睡眠的秒数"""
+        if not self.rate or n <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class DownloadJob:
+    """一个 URL 的下载任务，字段由下载线程更新，界面只读取"""
+
+    def __init__(self, index, url, profile):
+        self.index = index
+        self.url = url
+        self.profile = profile
+        self.host = url_host(url)
+        self.key = None
+        self.state = QUEUED
+        self.stage = None
+        self.error = None
+        self.filename = None
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.speed = None
+        self.eta = None
+        self.outputs = []
+        self.actions = []
+        self.post_seconds = 0.0
+        self.queued_at = time.time()
+        self.started_at = None
+        self.downloaded_at = None
+        self.finished_at = None
+        self._file_bytes = 0
+        self._post_pending = 0
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'url': self.url,
+            'profile': self.profile,
+            'key': self.key,
+            'state': self.state,
+            'stage': self.stage,
+            'error': self.error,
+            'filename': self.filename,
+            'bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'speed': self.speed,
+            'eta': self.eta,
+            'outputs': self.outputs,
+            'actions': self.actions,
+            'post_seconds': self.post_seconds,
+            'queued_at': self.queued_at,
+            'started_at': self.started_at,
+            'downloaded_at': self.downloaded_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class DownloadScheduler:
+    """并发下载调度器：workers 个下载线程，同一站点最多 per_host 个任务同时下载
+
+    每个下载线程为每种格式档位只创建一个 YoutubeDL 并一直复用（YoutubeDL 不是线程安全的，
+    所以按线程保存）。所有线程的下载速度共用一个 TokenBucket：进度回调在下载线程中
+    同步调用，在那里按新收到的字节数扣额度并睡眠，总速度就不会超过 rate_limit（字节/秒）。
+
+    下载完成后文件交给 pipeline（PostProcessPipeline）转换格式，下载线程立即处理下一个任务，
+    任务保持 postprocessing 状态直到转换完成。convert=False 时保留下载到的原始格式
+    （有 archive 时仍在进程池中计算 SHA-256 后写入下载记录）。
+    ydl_options 中的参数会覆盖 format_options() 的默认值。
+
+    archive（DownloadArchive，可选）记录已完成的视频：submit() 时不联网就能判断是否已经下载过，
+    已完成的任务直接标记为 done（actions 为 ['archived']）；提取结果也缓存在其中，
+    失败后重试时不用重新提取。
+
+    同一批中重复的视频（按「提取器 视频ID」，认不出 ID 时按 URL）只下载一次，
+    submit() 对重复的链接返回已有的任务。
+
+    on_update(job) 在任务状态变化时由下载线程或后处理结果线程调用，on_progress(job) 在每次
+    下载进度回调时由下载线程调用（次数很多，只应做很轻的操作）。submit() 添加任务，
+    close() 表示不再添加，队列中的任务全部完成后线程退出；wait() 等待下载和后处理结束。
+    """
+
+    def __init__(self, path, workers=4, per_host=4, rate_limit=None, on_update=None, pipeline=None,
+                 archive=None, on_progress=None, convert=True, ydl_options=None):
+        self.path = path
+        self.per_host = per_host
+        self.bucket = TokenBucket(rate_limit)
+        self.pipeline = pipeline or PostProcessPipeline()
+        self.convert = convert
+        self.ydl_options = ydl_options or {}
+        self.archive = archive
+        self.on_update = on_update
+        self.on_progress = on_progress
+        self.jobs = []
+        self.duplicates = 0
+        self._seen = {}
+        self._pending = collections.deque()
+        self._active_hosts = collections.Counter()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._cancelled = False
+        self._local = threading.local()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def submit(self, url, profile='mp3', key=None):
+        """添加任务；key 为已知的「提取器 视频ID」（例如展开播放列表时得到的），不传时从 URL 识别"""
+        if profile not in FORMAT_PROFILES:
+            raise ValueError(f"未知的下载格式: {profile}")
+        key = key or offline_key(url)
+        with self._cond:
+            job = self._seen.get((key or url, profile))
+        if job is not None:
+            self.duplicates += 1
+            return job
+        record = self.archive.lookup(key, url, self._archive_profile(profile)) if self.archive else None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("调度器已关闭")
+            job = self._seen.get((key or url, profile))
+            if job is not None:
+                self.duplicates += 1
+                return job
+            job = DownloadJob(len(self.jobs) + 1, url, profile)
+            self._seen[(key or url, profile)] = job
+            job.key = key
+            self.jobs.append(job)
+            if record is None:
+                self._pending.append(job)
+                self._cond.notify_all()
+        if record is not None:
+            self._skip(job, record)
+        else:
+            self._notify(job)
+        return job
+
+    def report_failure(self, url, profile, error):
+        """记录一个没有进入队列就失败的链接（例如播放列表展开失败）"""
+        with self._cond:
+            job = DownloadJob(len(self.jobs) + 1, url, profile)
+            self.jobs.append(job)
+        job.started_at = time.time()
+        self._fail(job, error)
+        return job
+
+    def _skip(self, job, record):
+        job.key = record['key']
+        job.outputs = [record['path']]
+        job.actions = ['archived']
+        job.started_at = job.finished_at = time.time()
+        self._set_state(job, DONE)
+
+    def _archive_profile(self, profile):
+        """下载记录中的格式档位；不转换时下载到的是原始格式，单独记录，不和转换后的文件混用"""
+        return profile if self.convert else f"{profile}-original"
+
+    def close(self):
+        """不再添加任务；已提交的任务继续下载"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def cancel(self):
+        """放弃队列中的任务，正在下载的任务在下一次进度回调时中止"""
+        with self._cond:
+            self._cancelled = True
+            self._closed = True
+            cancelled = list(self._pending)
+            self._pending.clear()
+            self._cond.notify_all()
+        for job in cancelled:
+            job.error = "已取消"
+            self._set_state(job, FAILED)
+
+    def wait(self, timeout=None):
+        """等待所有下载线程退出、后处理队列清空，返回是否全部结束"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        for thread in self._threads:
+            thread.join(remaining())
+        if any(thread.is_alive() for thread in self._threads) or not self.pipeline.wait(remaining()):
+            return False
+        self.pipeline.close()
+        return True
+
+    def counts(self):
+        """各状态的任务数"""
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for job in list(self.jobs):
+            counts[job.state] += 1
+        return counts
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"更新任务状态错误: {e}")
+
+    def _set_state(self, job, state, stage=None):
+        if job.state == state and job.stage == stage:
+            return
+        job.state = state
+        job.stage = stage
+        self._notify(job)
+
+    def _next_job(self):
+        """取出第一个所在站点还有空位的任务；队列已空且已关闭时返回 None"""
+        with self._cond:
+            while True:
+                for job in self._pending:
+                    if self._active_hosts[job.host] < self.per_host:
+                        self._pending.remove(job)
+                        self._active_hosts[job.host] += 1
+                        return job
+                if self._closed and not self._pending:
+                    return None
+                self._cond.wait()
+
+    def _release_host(self, job):
+        with self._cond:
+            self._active_hosts[job.host] -= 1
+            self._cond.notify_all()
+
+    def _ydl(self, profile):
+        """当前线程的 YoutubeDL（每种格式档位一个，跨任务复用）"""
+        if not hasattr(self._local, 'ydls'):
+            self._local.ydls = {}
+        ydl = self._local.ydls.get(profile)
+        if ydl is None:
+            options = format_options(profile, self.path)
+            options.update(self.ydl_options)
+            options['progress_hooks'] = [self._progress_hook]
+            options['postprocessor_hooks'] = [self._postprocessor_hook]
+            ydl = self._local.ydls[profile] = yt_dlp.YoutubeDL(options)
+        return ydl
+
+    def _worker(self):
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    break
+                self._run(job)
+        finally:
+            for ydl in getattr(self._local, 'ydls', {}).values():
+                try:
+                    ydl.close()
+                except Exception:
+                    pass
+
+    def _run(self, job):
+        self._local.job = job
+        job.started_at = time.time()
+        self._set_state(job, DOWNLOADING)
+        try:
+            files = self._download(job)
+        except Exception as e:
+            self._fail(job, "已取消" if self._cancelled else str(e))
+            return
+        finally:
+            self._local.job = None
+            self._release_host(job)
+        job.downloaded_at = time.time()
+        if files is None:
+            return
+        if not files:
+            self._fail(job, "没有下载到文件")
+            return
+        if not self.convert and self.archive is None:
+            job.outputs = files
+            job.actions = ['none'] * len(files)
+            job.finished_at = time.time()
+            self._set_state(job, DONE)
+            return
+        self._set_state(job, POSTPROCESSING)
+        job._post_pending = len(files)
+        task = process_file if self.convert else checksum_file
+        for path in files:
+            # 后处理队列满时在这里等待，下载随之放慢
+            try:
+                self.pipeline.submit(path, job.profile,
+                                     lambda result, error, job=job: self._post_done(job, result, error), task)
+            except Exception as e:
+                self._post_done(job, None, e)
+
+    def _download(self, job):
+        """提取并下载，返回下载到的文件；按视频 ID 发现已经下载过时标记完成并返回 None
+
+        有 archive 时先用缓存的提取结果；缓存中的视频地址可能已经过期，失败后重新提取一次。
+        """
+        ydl = self._ydl(job.profile)
+        if self.archive is None:
+            return downloaded_files(ydl.extract_info(job.url, download=True))
+        info = self.archive.cached_info(job.url)
+        cached = info is not None
+        if info is None:
+            info = ydl.sanitize_info(ydl.extract_info(job.url, download=False))
+            self.archive.store_info(job.url, info)
+        if info.get('id') and info.get('extractor_key'):
+            job.key = info_key(info)
+            record = self.archive.lookup(job.key, job.url, self._archive_profile(job.profile))
+            if record is not None:
+                self._skip(job, record)
+                return None
+        try:
+            return downloaded_files(ydl.process_ie_result(info, download=True))
+        except yt_dlp.utils.DownloadCancelled:
+            raise
+        except Exception:
+            if not cached:
+                raise
+            self.archive.drop_info(job.url)
+            info = ydl.sanitize_info(ydl.extract_info(job.url, download=False))
+            self.archive.store_info(job.url, info)
+            return downloaded_files(ydl.process_ie_result(info, download=True))
+
+    def _post_done(self, job, result, error):
+        """一个文件处理结束；出错（包括写下载记录出错）时任务记为失败，但一定会结束"""
+        try:
+            if error is not None:
+                job.error = job.error or f"后处理失败: {error}"
+            else:
+                job.outputs.append(result['path'])
+                job.actions.append(result['action'])
+                job.post_seconds += result['seconds']
+                if self.archive:
+                    # 认不出视频 ID 的链接按 URL 记录，和 lookup() 一致
+                    self.archive.record(job.key or job.url, job.url, self._archive_profile(job.profile),
+                                        result['path'], result['sha256'], result['size'])
+        except Exception as e:
+            job.error = job.error or f"保存下载记录失败: {e}"
+        finally:
+            job._post_pending -= 1
+            if job._post_pending == 0:
+                job.finished_at = time.time()
+                self._set_state(job, FAILED if job.error else DONE)
+
+    def _fail(self, job, error):
+        job.finished_at = time.time()
+        job.error = error
+        self._set_state(job, FAILED)
+
+    def _progress_hook(self, d):
+        job = getattr(self._local, 'job', None)
+        if job is None:
+            return
+        if self._cancelled:
+            raise yt_dlp.utils.DownloadCancelled()
+        job.filename = d.get('filename', job.filename)
+        if d['status'] == 'finished':
+            # mp4 的视频和音频是两个文件，下一个文件的计数从 0 重新开始
+            job._file_bytes = 0
+            return
+        if d['status'] != 'downloading':
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        delta = max(0, downloaded - job._file_bytes)
+        job._file_bytes = downloaded
+        job.downloaded_bytes += delta
+        job.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+        job.speed = d.get('speed')
+        job.eta = d.get('eta')
+        self._set_state(job, DOWNLOADING)
+        if self.on_progress:
+            self.on_progress(job)
+        self.bucket.consume(delta)
+
+    def _postprocessor_hook(self, d):
+        job = getattr(self._local, 'job', None)
+        if job is not None and d['status'] == 'started':
+            self._set_state(job, POSTPROCESSING, d.get('postprocessor'))
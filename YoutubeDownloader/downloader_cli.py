@@ -0,0 +1,153 @@
+"""无界面的批量下载：从文件读取链接，下载完成后写出 JSON 报告，可用于计划任务
+
+用法::
+
+    python youtube_downloader.py --urls list.txt --format mp3 --out downloads -j 4 --report report.json
+    python youtube_downloader.py --urls - < list.txt           # 从标准输入读取链接
+    python youtube_downloader.py --benchmark --levels 1,2,4,8   # 离线吞吐基准测试（见 bench_downloader.py）
+
+链接文件每行一个，空行和 # 开头的行会被忽略。报告中每个链接一项，包含状态、输出文件、
+处理方式，以及排队、下载、后处理各阶段的耗时（秒）。有失败的链接时退出码为 1。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from archive import DownloadArchive
+from download_scheduler import DONE, DOWNLOADING, FAILED, FORMAT_PROFILES, POSTPROCESSING, DownloadScheduler
+from playlist_expander import PlaylistExpander
+
+MB = 1024 * 1024
+
+
+def read_urls(path):
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+def job_timings(job):
+    """各阶段耗时：queue 排队，download 提取和下载，postprocess 等待转换和转换，total 从提交到结束"""
+    def span(start, end):
+        return round(end - start, 3) if start is not None and end is not None else None
+
+    return {
+        'queue': span(job.queued_at, job.started_at),
+        'download': span(job.started_at, job.downloaded_at),
+        'postprocess': span(job.downloaded_at, job.finished_at),
+        'postprocess_cpu': round(job.post_seconds, 3),
+        'total': span(job.queued_at, job.finished_at),
+    }
+
+
+def print_update(job):
+    if job.state == DOWNLOADING and job.stage is None and not job.downloaded_bytes:
+        print(f"[{job.index}] 下载中: {job.url}")
+    elif job.state == POSTPROCESSING and job.stage is None:
+        print(f"[{job.index}] 转换格式: {job.url}")
+    elif job.state == DONE:
+        print(f"[{job.index}] 完成: {job.url} ({', '.join(job.actions)})")
+    elif job.state == FAILED:
+        print(f"[{job.index}] 失败: {job.url} - {job.error}")
+
+
+def run_batch(urls, path, profile='mp3', workers=4, per_host=None, rate_limit=None, archive=True,
+              convert=True, ydl_options=None, on_update=print_update):
+    """下载一批链接并返回报告 dict；Ctrl+C 时取消剩余任务，已完成的任务仍写入报告"""
+    os.makedirs(path, exist_ok=True)
+    store = DownloadArchive.in_folder(path) if archive else None
+    started = time.time()
+    t0 = time.perf_counter()
+    scheduler = DownloadScheduler(path, workers=workers, per_host=per_host or workers, rate_limit=rate_limit,
+                                  on_update=on_update, archive=store, convert=convert, ydl_options=ydl_options)
+    PlaylistExpander(scheduler, urls, profile)
+    try:
+        # 带超时轮询，Windows 上 Ctrl+C 也能打断等待
+        while not scheduler.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        print("正在取消...")
+        scheduler.cancel()
+        scheduler.wait()
+    finally:
+        if store:
+            store.close()
+    seconds = time.perf_counter() - t0
+    jobs = list(scheduler.jobs)
+    downloaded = sum(job.downloaded_bytes for job in jobs)
+    return {
+        'path': os.path.abspath(path),
+        'profile': profile,
+        'workers': workers,
+        'per_host': per_host or workers,
+        'rate_limit': rate_limit,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        'seconds': round(seconds, 3),
+        'counts': scheduler.counts(),
+        'duplicates': scheduler.duplicates,
+        'cancelled': scheduler.cancelled,
+        'bytes': downloaded,
+        'items_per_second': scheduler.counts()[DONE] / seconds if seconds else None,
+        'mb_per_second': downloaded / MB / seconds if seconds else None,
+        'items': [dict(job.to_dict(), timings=job_timings(job)) for job in jobs],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YouTube 批量下载（命令行）")
+    parser.add_argument("--urls", help="链接文件，每行一个；- 表示标准输入")
+    parser.add_argument("-f", "--format", choices=FORMAT_PROFILES, default="mp3", help="下载格式")
+    parser.add_argument("-o", "--out", default=os.path.join(os.path.expanduser("~"), "Downloads"), help="保存路径")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="同时下载数")
+    parser.add_argument("--per-host", type=int, help="同一网站最多同时下载数（默认等于同时下载数）")
+    parser.add_argument("--rate", type=float, default=0, help="总限速 MB/s，0 表示不限速")
+    parser.add_argument("--report", help="JSON 报告文件")
+    parser.add_argument("--no-archive", action="store_true", help="不使用下载记录（不跳过已下载的视频）")
+    parser.add_argument("--no-convert", action="store_true", help="保留下载到的原始格式，不转换")
+    parser.add_argument("--benchmark", action="store_true", help="离线吞吐基准测试，不需要联网")
+    parser.add_argument("--levels", default="1,2,4,8", help="基准测试的同时下载数，逗号分隔")
+    parser.add_argument("--items", type=int, default=16, help="基准测试的文件数")
+    parser.add_argument("--size-mb", type=float, default=4, help="基准测试每个文件的大小（MB）")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        import bench_downloader
+        bench_argv = ["--levels", args.levels, "--items", str(args.items), "--size-mb", str(args.size_mb),
+                      "--format", args.format]
+        if args.report:
+            bench_argv += ["--output", args.report]
+        if args.no_convert:
+            bench_argv.append("--no-convert")
+        return bench_downloader.main(bench_argv)
+
+    if not args.urls:
+        parser.error("需要 --urls 或 --benchmark")
+    urls = read_urls(args.urls)
+    if not urls:
+        print("没有可下载的链接")
+        return 1
+    if args.concurrency < 1:
+        parser.error("同时下载数至少为 1")
+
+    print(f"下载 {len(urls)} 个链接到 {args.out}，格式 {args.format.upper()}，同时下载 {args.concurrency} 个"
+          + (f"，限速 {args.rate} MB/s" if args.rate else ""))
+    report = run_batch(urls, args.out, args.format, workers=args.concurrency, per_host=args.per_host,
+                       rate_limit=args.rate * MB if args.rate > 0 else None, archive=not args.no_archive,
+                       convert=not args.no_convert)
+    counts = report['counts']
+    print(f"用时 {report['seconds']:.1f}s，成功 {counts[DONE]} 个，失败 {counts[FAILED]} 个"
+          + (f"，重复链接 {report['duplicates']} 个" if report['duplicates'] else ""))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"报告已保存到 {args.report}")
+    return 1 if counts[FAILED] or report['cancelled'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
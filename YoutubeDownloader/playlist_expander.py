@@ -0,0 +1,131 @@
+import itertools
+import threading
+
+import yt_dlp
+from yt_dlp.extractor import get_info_extractor
+from yt_dlp.utils import PagedList, make_archive_id
+
+from archive import find_extractor
+
+# 频道首页的条目是各个标签页（视频、Shorts、直播），每个标签页又是一个列表
+MAX_DEPTH = 3
+
+
+def is_single_video(url):
+    """不联网判断链接是不是单个视频；只有通用提取器能处理的链接（直链等）也当作单个视频"""
+    ie = find_extractor(url)
+    return ie is None or ie.is_single_video(url) is True
+
+
+def iter_entries(entries):
+    """逐个取出列表条目，只在需要时才请求下一页"""
+    if isinstance(entries, PagedList):
+        for i in itertools.count():
+            try:
+                yield entries[i]
+            except entries.IndexError:
+                return
+    else:
+        yield from entries or ()
+
+
+def is_video_entry(entry):
+    """extract_flat 得到的条目是否指向单个视频（频道的标签页、子列表不是）"""
+    ie_key = entry.get('ie_key')
+    if ie_key:
+        return_type = get_info_extractor(ie_key)._RETURN_TYPE
+        if return_type in ('video', 'playlist'):
+            return return_type == 'video'
+    return is_single_video(entry.get('url') or entry.get('webpage_url') or '')
+
+
+def entry_key(entry):
+    ie_key = entry.get('ie_key') or entry.get('extractor_key')
+    if ie_key and entry.get('id'):
+        return make_archive_id(ie_key, entry['id'])
+    return None
+
+
+class PlaylistExpander:
+    """后台线程：把输入的链接展开成单个视频，边发现边提交给调度器
+
+    先提交所有单个视频的链接，再依次展开播放列表和频道。展开使用 extract_flat
+    （只读列表，不解析每个视频）和 process=False，条目是按页请求的生成器，
+    第一页返回后第一个视频就开始下载，不用等整个列表走完。
+
+    重复的视频由调度器按「提取器 视频ID」去重。全部展开后调用 scheduler.close()。
+    展开失败的链接作为失败任务记录（scheduler.report_failure）。
+    """
+
+    def __init__(self, scheduler, urls, profile):
+        self.scheduler = scheduler
+        self.urls = list(urls)
+        self.profile = profile
+        self.expanded = 0
+        self._ydl = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self):
+        try:
+            playlists = []
+            for url in self.urls:
+                if is_single_video(url):
+                    self.scheduler.submit(url, self.profile)
+                else:
+                    playlists.append(url)
+            for url in playlists:
+                if self.scheduler.cancelled:
+                    break
+                try:
+                    for entry_url, key in self.expand(url):
+                        if self.scheduler.cancelled:
+                            break
+                        self.scheduler.submit(entry_url, self.profile, key)
+                        self.expanded += 1
+                except Exception as e:
+                    self.scheduler.report_failure(url, self.profile, f"展开列表失败: {e}")
+        finally:
+            if self._ydl:
+                self._ydl.close()
+            self.scheduler.close()
+
+    def expand(self, url, ie_key=None, depth=0):
+        """生成 (视频链接, 视频 key)；url 本身就是视频时生成它自己"""
+        if self._ydl is None:
+            self._ydl = yt_dlp.YoutubeDL({'extract_flat': 'in_playlist', 'lazy_playlist': True,
+                                          'quiet': True, 'noprogress': True})
+        info = self._ydl.extract_info(url, download=False, process=False, ie_key=ie_key)
+        kind = info.get('_type', 'video')
+        if kind in ('playlist', 'multi_video'):
+            yield from self._walk(info.get('entries'), depth)
+        elif kind in ('url', 'url_transparent') and not is_video_entry(info) and depth < MAX_DEPTH:
+            # 跳转到另一个提取器（例如短链接）
+            yield from self.expand(info['url'], info.get('ie_key'), depth + 1)
+        else:
+            yield info.get('webpage_url') or url, entry_key(info)
+
+    def _walk(self, entries, depth):
+        for entry in iter_entries(entries):
+            if not entry:
+                continue
+            if entry.get('_type') in ('playlist', 'multi_video'):
+                if depth < MAX_DEPTH:
+                    yield from self._walk(entry.get('entries'), depth + 1)
+                continue
+            if entry.get('_type') in ('url', 'url_transparent'):
+                entry_url = entry.get('url')
+            else:
+                # 完整解析过的视频条目中 url 是媒体文件地址，要用视频页面
+                entry_url = entry.get('webpage_url') or entry.get('url')
+            if not entry_url:
+                continue
+            if entry.get('_type') in ('url', 'url_transparent') and not is_video_entry(entry):
+                if depth < MAX_DEPTH:
+                    yield from self.expand(entry_url, entry.get('ie_key'), depth + 1)
+                continue
+            yield entry_url, entry_key(entry)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+# MP4 容器可以直接装下的编码，遇到这些只需要重新封装（-c copy）
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1', 'mpeg4'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac'}
+
+MP3_TRANSCODE = ['-c:a', 'libmp3lame', '-b:a', '192k']
+AAC_TRANSCODE = ['-c:a', 'aac', '-b:a', '192k']
+H264_TRANSCODE = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20']
+
+
+def probe(path):
+    """用 ffprobe 读取容器格式和第一条视频/音频流的编码：('mov,mp4,...', {'video': 'h264', 'audio': 'aac'})"""
+    result = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_type,codec_name:format=format_name',
+                             '-of', 'json', path], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe 失败: {result.stderr.strip()[-300:]}")
+    data = json.loads(result.stdout)
+    codecs = {}
+    for stream in data.get('streams', []):
+        codecs.setdefault(stream.get('codec_type'), stream.get('codec_name'))
+    return data.get('format', {}).get('format_name', ''), codecs
+
+
+def plan(profile, path, container, codecs):
+    """决定最便宜的处理方式，返回 (action, 输出路径, ffmpeg 参数)
+
+    action 为 keep（已经是目标格式）、copy（只换容器/去掉视频流）、remux（重新封装为 mp4）、
+    audio（视频流复制，只转码音频）或 transcode（完整转码）。
+    """
+    base, ext = os.path.splitext(path)
+    video, audio = codecs.get('video'), codecs.get('audio')
+    if profile == 'mp3':
+        target = base + '.mp3'
+        if audio == 'mp3':
+            if ext.lower() == '.mp3' and not video:
+                return 'keep', target, None
+            return 'copy', target, ['-vn', '-c:a', 'copy']
+        return 'transcode', target, ['-vn'] + MP3_TRANSCODE
+    target = base + '.mp4'
+    video_ok = video is None or video in MP4_VIDEO_CODECS
+    audio_ok = audio is None or audio in MP4_AUDIO_CODECS
+    if video_ok and audio_ok:
+        if ext.lower() == '.mp4' and 'mp4' in container:
+            return 'keep', target, None
+        return 'remux', target, ['-c', 'copy', '-movflags', '+faststart']
+    if video_ok:
+        return 'audio', target, ['-c:v', 'copy'] + AAC_TRANSCODE + ['-movflags', '+faststart']
+    return 'transcode', target, H264_TRANSCODE + AAC_TRANSCODE + ['-movflags', '+faststart']
+
+
+def file_sha256(path, block=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(block), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def process_file(path, profile):
+    """在进程池中运行：探测后按 plan() 处理一个下载完成的文件，成功后删除原文件
+
+    顺便计算输出文件的 SHA-256（写入下载记录），这部分 CPU 也不占用下载线程。
+    """
+    t0 = time.perf_counter()
+    container, codecs = probe(path)
+    action, target, args = plan(profile, path, container, codecs)
+    if action != 'keep':
+        # 先写临时文件，中途失败不会留下半个目标文件；目标和原文件同名时也能处理
+        base, ext = os.path.splitext(target)
+        tmp = f"{base}.tmp{ext}"
+        result = subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', path] + args + [tmp],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise RuntimeError(f"ffmpeg {action} 失败: {result.stderr.strip()[-300:]}")
+        os.replace(tmp, target)
+        if os.path.abspath(path) != os.path.abspath(target):
+            os.remove(path)
+    return {'path': target, 'action': action, 'sha256': file_sha256(target), 'size': os.path.getsize(target),
+            'seconds': time.perf_counter() - t0}
+
+
+def checksum_file(path, profile):
+    """不转换格式时使用：只计算 SHA-256 和大小，结果格式和 process_file() 相同"""
+    t0 = time.perf_counter()
+    return {'path': path, 'action': 'none', 'sha256': file_sha256(path), 'size': os.path.getsize(path),
+            'seconds': time.perf_counter() - t0}
+
+
+class PostProcessPipeline:
+    """后处理流水线：下载完成的文件进入有界队列，由 CPU 核数个进程转码
+
+    下载线程调用 submit() 后马上回去下载下一个视频，网络和 CPU 同时忙碌；
+    排队的文件超过 max_pending 个时 submit() 阻塞，下载自然放慢，不会在磁盘上
+    堆积大量待转码文件。callback(result, error) 在结果线程中调用，每个文件恰好调用一次：
+    关闭时被取消的文件也会以 error 为 CancelledError 调用。
+    task 为在子进程中运行的函数，默认 process_file，不转换时用 checksum_file。
+    """
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.pending = 0
+        self._slots = threading.Semaphore(self.max_pending)
+        self._cond = threading.Condition()
+        self._executor = None
+
+    def submit(self, path, profile, callback, task=process_file):
+        self._slots.acquire()
+        with self._cond:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self._executor
+            self.pending += 1
+        try:
+            future = executor.submit(task, path, profile)
+        except Exception:
+            self._finish()
+            raise
+        future.add_done_callback(lambda f: self._done(f, callback))
+
+    def _done(self, future, callback):
+        try:
+            if future.cancelled():
+                result, error = None, CancelledError("已取消")
+            else:
+                error = future.exception()
+                result = None if error else future.result()
+            callback(result, error)
+        except Exception as e:
+            print(f"后处理回调错误: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self):
+        self._slots.release()
+        with self._cond:
+            self.pending -= 1
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """等待队列中的文件全部处理完，返回是否已清空"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.pending == 0, timeout)
+
+    def close(self):
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,42 @@
+import collections
+import threading
+
+
+class ProgressBus:
+    """下载线程和界面之间的进度事件队列
+
+    publish_job() / publish_log() 可以在任何线程中调用，只做一次字典赋值或 deque 追加，
+    不碰 Tk。同一个任务在两次 drain() 之间的多次更新合并为一条（界面读取任务对象
+    的最新字段：已下载字节、速度、剩余时间、状态）。未取走的日志最多保留 max_log 行，
+    超出时丢弃最旧的并计入 dropped_logs。
+
+    界面在 Tk 主线程中用 after() 定时调用 drain()，每次刷新的代价只和变化的任务数
+    以及日志上限有关，和事件产生的速度无关。
+    """
+
+    def __init__(self, max_log=500):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._logs = collections.deque(maxlen=max_log)
+        self.events = 0
+        self.dropped_logs = 0
+
+    def publish_job(self, job):
+        with self._lock:
+            self._jobs[job.index] = job
+            self.events += 1
+
+    def publish_log(self, message):
+        with self._lock:
+            if len(self._logs) == self._logs.maxlen:
+                self.dropped_logs += 1
+            self._logs.append(message)
+            self.events += 1
+
+    def drain(self):
+        """取走积累的事件，返回 (有变化的任务列表, 日志消息列表)"""
+        with self._lock:
+            jobs, self._jobs = self._jobs, {}
+            logs = list(self._logs)
+            self._logs.clear()
+        return list(jobs.values()), logs
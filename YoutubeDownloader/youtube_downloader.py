@@ -1,14 +1,43 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
-import yt_dlp
+from tkinter import filedialog, messagebox, scrolledtext, ttk
+import multiprocessing
 import os
+import sys
 import threading
 
+from archive import DownloadArchive
+from download_scheduler import DONE, DOWNLOADING, FAILED, POSTPROCESSING, QUEUED, DownloadScheduler
+from playlist_expander import PlaylistExpander
+from progress_bus import ProgressBus
+
+STATE_LABELS = {QUEUED: "排队", DOWNLOADING: "下载中", POSTPROCESSING: "转换中", DONE: "完成", FAILED: "失败"}
+
+
+def format_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
 class YouTubeDownloader:
     def __init__(self, root):
         self.root = root
         self.root.title("YouTube批量下载器")
-        self.root.geometry("500x450")
+        self.root.geometry("640x720")
+        self.scheduler = None
+        # 下载线程只把事件放进 bus，界面每 refresh_interval 毫秒在主线程中统一刷新
+        self.bus = ProgressBus()
+        self.refresh_interval = 200  # ms
+        self.max_log_lines = 500
         
         # URL输入框
         tk.Label(root, text="输入YouTube URL（每行一个）:").pack(pady=5)
@@ -30,14 +59,40 @@ class YouTubeDownloader:
         path_frame.pack(pady=5)
         tk.Entry(path_frame, textvariable=self.path_var, width=40).pack(side=tk.LEFT)
         tk.Button(path_frame, text="浏览", command=self.browse_path).pack(side=tk.LEFT, padx=5)
+
+        # 并发数和总带宽上限
+        options_frame = tk.Frame(root)
+        options_frame.pack(pady=5)
+        tk.Label(options_frame, text="同时下载:").pack(side=tk.LEFT)
+        self.workers_var = tk.IntVar(value=4)
+        tk.Spinbox(options_frame, from_=1, to=16, textvariable=self.workers_var, width=4).pack(side=tk.LEFT, padx=5)
+        tk.Label(options_frame, text="限速 MB/s (0=不限):").pack(side=tk.LEFT, padx=(10, 0))
+        self.rate_var = tk.StringVar(value="0")
+        tk.Entry(options_frame, textvariable=self.rate_var, width=6).pack(side=tk.LEFT, padx=5)
         
         # 下载按钮
         tk.Button(root, text="开始批量下载", command=self.start_download, bg="green", fg="white").pack(pady=10)
         
+        # 每个任务一行
+        tk.Label(root, text="下载任务:").pack(pady=5)
+        jobs_frame = tk.Frame(root)
+        jobs_frame.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
+        columns = ("state", "progress", "speed", "eta", "url")
+        self.job_tree = ttk.Treeview(jobs_frame, columns=columns, show="headings", height=8)
+        for column, text, width in zip(columns, ("状态", "进度", "速度", "剩余", "URL"), (60, 120, 80, 50, 300)):
+            self.job_tree.heading(column, text=text)
+            self.job_tree.column(column, width=width, stretch=(column == "url"))
+        job_scrollbar = ttk.Scrollbar(jobs_frame, orient="vertical", command=self.job_tree.yview)
+        self.job_tree.configure(yscrollcommand=job_scrollbar.set)
+        self.job_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        job_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
         # 日志输出
         tk.Label(root, text="下载日志:").pack(pady=5)
         self.log_text = scrolledtext.ScrolledText(root, height=6, width=60, state=tk.DISABLED)
         self.log_text.pack(pady=5)
+
+        self.root.after(self.refresh_interval, self.drain_events)
     
     def browse_path(self):
         folder = filedialog.askdirectory()
@@ -45,39 +100,55 @@ class YouTubeDownloader:
             self.path_var.set(folder)
     
     def log(self, message):
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
-        self.root.update()
-    
-    def download_single(self, url, path, format_type):
-        if format_type == "mp3":
-            ydl_opts = {
-                'format': 'bestaudio/best',  # 只下载最佳音频
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),  # 文件名格式
-            }
-        else:  # mp4
-            ydl_opts = {
-                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best',  # 下载最佳视频
-                'merge_output_format': 'mp4',  # 合并为mp4格式
-                'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),  # 文件名格式
-                'postprocessors': [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }],
-            }
+        """可以在任何线程中调用，消息由 drain_events() 显示"""
+        self.bus.publish_log(message)
+
+    def drain_events(self):
+        """Tk 主线程定时调用：一次性刷新有变化的任务行和新日志"""
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            return f"成功: {url}"
-        except Exception as e:
-            return f"失败: {url} - {str(e)}"
+            jobs, messages = self.bus.drain()
+            for job in jobs:
+                self.update_job_row(job)
+            if messages:
+                self.log_text.config(state=tk.NORMAL)
+                self.log_text.insert(tk.END, "\n".join(messages) + "\n")
+                # 只保留最后 max_log_lines 行
+                lines = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                if lines > self.max_log_lines:
+                    self.log_text.delete("1.0", f"{lines - self.max_log_lines + 1}.0")
+                self.log_text.see(tk.END)
+                self.log_text.config(state=tk.DISABLED)
+        finally:
+            self.root.after(self.refresh_interval, self.drain_events)
+
+    def update_job_row(self, job):
+        if job.state == DOWNLOADING and job.total_bytes:
+            progress = f"{job.downloaded_bytes / job.total_bytes:.0%} {format_bytes(job.total_bytes)}"
+        else:
+            progress = format_bytes(job.downloaded_bytes) if job.downloaded_bytes else ""
+        speed = f"{format_bytes(job.speed)}/s" if job.state == DOWNLOADING and job.speed else ""
+        eta = format_eta(job.eta) if job.state == DOWNLOADING else ""
+        values = (STATE_LABELS[job.state], progress, speed, eta, job.url)
+        iid = str(job.index)
+        if self.job_tree.exists(iid):
+            self.job_tree.item(iid, values=values)
+        else:
+            self.job_tree.insert("", tk.END, iid=iid, values=values)
+
+    def on_job_update(self, job):
+        """任务状态变化时由下载线程调用"""
+        self.bus.publish_job(job)
+        total = len(self.scheduler.jobs) if self.scheduler else job.index
+        if job.state == DOWNLOADING:
+            self.log(f"[{job.index}/{total}] 下载中: {job.url}")
+        elif job.state == POSTPROCESSING and job.stage is None:
+            self.log(f"[{job.index}/{total}] 下载完成，转换格式: {job.url}")
+        elif job.state == DONE and job.actions == ['archived']:
+            self.log(f"[{job.index}/{total}] 已下载过，跳过: {job.url}")
+        elif job.state == DONE:
+            self.log(f"成功: {job.url} ({', '.join(job.actions)})")
+        elif job.state == FAILED:
+            self.log(f"失败: {job.url} - {job.error}")
     
     def start_download(self):
         urls = [line.strip() for line in self.url_text.get(1.0, tk.END).strip().split('\n') if line.strip()]
@@ -85,23 +156,49 @@ class YouTubeDownloader:
             messagebox.showwarning("警告", "请输入至少一个URL！")
             return
         
+        if self.scheduler and not self.scheduler.wait(0):
+            messagebox.showwarning("警告", "上一批下载还没有完成！")
+            return
+        try:
+            workers = max(1, int(self.workers_var.get()))
+            rate = float(self.rate_var.get() or 0)
+        except (ValueError, tk.TclError):
+            messagebox.showwarning("警告", "同时下载数和限速必须是数字！")
+            return
+
         path = self.path_var.get()
         if not os.path.exists(path):
             os.makedirs(path)
-        
-        self.log("开始下载...")
-        threading.Thread(target=self._download_thread, args=(urls, path), daemon=True).start()
-    
-    def _download_thread(self, urls, path):
+
         format_type = self.format_var.get()
-        self.log(f"下载格式: {format_type.upper()}")
-        for i, url in enumerate(urls, 1):
-            self.log(f"[{i}/{len(urls)}] 下载中: {url}")
-            result = self.download_single(url, path, format_type)
-            self.log(result)
-        self.log("所有下载完成！")
+        # 丢弃上一批还没显示的事件，避免任务编号相同的旧行被重新加回来
+        self.bus.drain()
+        self.job_tree.delete(*self.job_tree.get_children())
+        self.log("开始下载...")
+        self.log(f"下载格式: {format_type.upper()}，同时下载 {workers} 个" + (f"，限速 {rate} MB/s" if rate else ""))
+        # 下载记录保存在下载目录中，重新运行同一批链接时跳过已完成的视频
+        self.scheduler = DownloadScheduler(path, workers=workers, per_host=workers,
+                                           rate_limit=rate * 1024 * 1024 if rate > 0 else None,
+                                           on_update=self.on_job_update, on_progress=self.bus.publish_job,
+                                           archive=DownloadArchive.in_folder(path))
+        # 播放列表和频道在后台逐页展开，第一个视频不用等整个列表
+        PlaylistExpander(self.scheduler, urls, format_type)
+        threading.Thread(target=self._wait_thread, args=(self.scheduler,), daemon=True).start()
+
+    def _wait_thread(self, scheduler):
+        scheduler.wait()
+        scheduler.archive.close()
+        counts = scheduler.counts()
+        self.log(f"所有下载完成！成功 {counts[DONE]} 个，失败 {counts[FAILED]} 个"
+                 + (f"，重复链接 {scheduler.duplicates} 个" if scheduler.duplicates else ""))
 
 if __name__ == "__main__":
+    # 转换格式使用进程池，打包成 exe 后子进程需要这一行
+    multiprocessing.freeze_support()
+    # 带命令行参数时不打开窗口，按 downloader_cli.py 批量下载或运行基准测试
+    if len(sys.argv) > 1:
+        import downloader_cli
+        sys.exit(downloader_cli.main())
     root = tk.Tk()
     app = YouTubeDownloader(root)
     root.mainloop()
\ No newline at end of file